@@ -0,0 +1,100 @@
+import os
+import shutil
+import threading
+
+from pathlib import Path
+from typing import Callable, Optional
+
+DEFAULT_ARTIFACT_CACHE_DIR = Path(
+    os.environ.get(
+        "BATCH_CALCULATOR_CACHE_DIR", Path.home() / ".cache" / "batch-calculator"
+    )
+)
+DEFAULT_ARTIFACT_CACHE_SIZE = 10  # GB
+
+
+def artifact_key(threedimodel_id: int, revision_id: int) -> str:
+    return f"model-{threedimodel_id}-revision-{revision_id}"
+
+
+def artifact_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def link_artifact(source: Path, target: Path) -> None:
+    """
+    Hard link the file (or all files in the directory) source to target, falling
+    back to a copy when the cache is on another filesystem. Existing files are
+    replaced.
+    """
+    if source.is_dir():
+        for file in source.rglob("*"):
+            if file.is_file():
+                link_artifact(file, target / file.relative_to(source))
+        return
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists():
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ArtifactCache:
+    """
+    Local cache of model artifacts (sqlite, gridadmin) in directory. Artifacts are
+    stored per key, see artifact_key, and evicted least recently used first when
+    the total size exceeds max_size bytes.
+
+    The cached files are hard linked into the results dir, they should be opened
+    read-only.
+    """
+
+    def __init__(self, directory: Path, max_size: float):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def fetch(self, key: str, name: str, download: Callable[[Path], None]) -> Path:
+        """
+        Return the path of artifact name of key, calling download with a
+        temporary path to create it when it is not cached yet.
+        """
+        entry = self.directory / key
+        path = entry / name
+        if not path.exists():
+            entry.mkdir(parents=True, exist_ok=True)
+            # download next to the artifact and move it in place once complete
+            tmp_path = entry / f".{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                download(tmp_path)
+                if not path.exists():
+                    tmp_path.rename(path)
+            finally:
+                if tmp_path.is_dir():
+                    shutil.rmtree(tmp_path)
+                elif tmp_path.exists():
+                    tmp_path.unlink()
+
+        # the modification time of the entry marks its last use
+        os.utime(entry)
+        self.evict(keep=key)
+        return path
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used entries until the cache fits max_size."""
+        entries = sorted(
+            (entry for entry in self.directory.iterdir() if entry.is_dir()),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        sizes = {entry: artifact_size(entry) for entry in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            if entry.name != keep:
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= sizes[entry]
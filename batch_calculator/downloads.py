@@ -0,0 +1,72 @@
+import hashlib
+import re
+import shutil
+
+from batch_calculator.metrics import run_metrics
+from pathlib import Path
+from typing import Optional
+from urllib.request import Request, urlopen
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_md5(path: Path) -> str:
+    md5 = hashlib.md5()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def file_complete(
+    path: Path, size: Optional[int] = None, etag: Optional[str] = None
+) -> bool:
+    """
+    Check whether path is a complete copy of a file with the given size and etag
+    from the API file metadata. The etag is only compared when it is an md5
+    checksum, which is not the case for files uploaded in multiple parts.
+    """
+    if not path.is_file() or (size is not None and path.stat().st_size != size):
+        return False
+    etag = (etag or "").strip('"')
+    if re.fullmatch(r"[0-9a-f]{32}", etag):
+        return file_md5(path) == etag
+    return True
+
+
+def download_file(
+    url: str, path: Path, size: Optional[int] = None, etag: Optional[str] = None
+) -> int:
+    """
+    Download url to path and return the number of downloaded bytes.
+
+    The file is first written to path.part. When a partial download is found it
+    is resumed with a Range request, in case the server does not support ranges
+    it is downloaded again. The result is verified against size and etag.
+    """
+    part_path = path.with_name(path.name + ".part")
+    offset = part_path.stat().st_size if part_path.is_file() else 0
+    if size is not None and offset > size:
+        offset = 0
+
+    if size is None or offset < size:
+        request = Request(url)
+        if offset > 0:
+            request.add_header("Range", f"bytes={offset}-")
+        with urlopen(request) as response:
+            if response.status != 206:
+                offset = 0
+            with part_path.open("ab" if offset > 0 else "wb") as f:
+                shutil.copyfileobj(response, f, CHUNK_SIZE)
+    nbytes = part_path.stat().st_size - offset
+    run_metrics.transferred("downloaded", nbytes)
+
+    if not file_complete(part_path, size, etag):
+        part_path.unlink()
+        if offset > 0:
+            # the resumed part may have been corrupt, try once more from scratch
+            return nbytes + download_file(url, path, size, etag)
+        raise ValueError(f"Downloaded {path.name} does not match its size or etag")
+
+    part_path.replace(path)
+    return nbytes
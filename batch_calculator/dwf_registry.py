@@ -0,0 +1,64 @@
+import json
+
+from batch_calculator.artifacts import artifact_key
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+DWF_REGISTRY_FILENAME = "dwf_registry.json"
+
+
+class DWFRegistry:
+    """
+    Persistent mapping of (threedimodel id, revision id, organisation) to the id
+    of a finished DWF simulation, whose 'DWF hour {i}' saved states can be used
+    by later batches on the same model revision. Stored as a JSON file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def read(self) -> dict:
+        try:
+            with self.path.open("r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write(self, registry: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w") as f:
+            json.dump(registry, f, indent=4)
+        tmp_path.replace(self.path)
+
+    def get(
+        self, threedimodel_id: int, revision_id: int, organisation: str
+    ) -> Optional[int]:
+        key = artifact_key(threedimodel_id, revision_id)
+        entry = self.read().get(key, {}).get(organisation)
+        return entry["simulation_id"] if entry else None
+
+    def register(
+        self,
+        threedimodel_id: int,
+        revision_id: int,
+        organisation: str,
+        simulation_id: int,
+    ) -> None:
+        registry = self.read()
+        registry.setdefault(artifact_key(threedimodel_id, revision_id), {})[
+            organisation
+        ] = {
+            "simulation_id": simulation_id,
+            "registered": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.write(registry)
+
+    def remove(self, threedimodel_id: int, revision_id: int, organisation: str) -> None:
+        registry = self.read()
+        key = artifact_key(threedimodel_id, revision_id)
+        if registry.get(key, {}).pop(organisation, None) is not None:
+            if not registry[key]:
+                del registry[key]
+            self.write(registry)
@@ -0,0 +1,177 @@
+import json
+import sqlite3
+import threading
+
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+)
+
+JOURNAL_FILENAME = "batch_journal.sqlite"
+
+# Journal keys of the batch itself and of the DWF simulation, rain events use
+# their name as key.
+BATCH = "batch"
+DWF = "dwf"
+
+# Phases, in the order in which they are passed
+STARTED = "started"
+CREATED = "created"
+SAVED_STATES_CREATED = "saved_states_created"
+RAIN_UPLOADED = "rain_uploaded"
+SAVED_STATE_SET = "saved_state_set"
+QUEUED = "queued"
+FINISHED = "finished"
+
+
+class Journal:
+    """
+    Append-only log of the phases passed per event of a batch run, stored in a
+    SQLite file. A (new) simulation for an event starts at the created phase,
+    later phases are registered for that simulation.
+
+    The journal can be shared between threads and can be read by other processes
+    while the batch is running.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "event TEXT NOT NULL, "
+            "phase TEXT NOT NULL, "
+            "simulation_id INTEGER, "
+            "data TEXT, "
+            "created TEXT NOT NULL)"
+        )
+        # state() reads the rows of an event in order, per event in large batches
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS journal_event ON journal (event, id)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def record(
+        self,
+        event: str,
+        phase: str,
+        simulation_id: Optional[int] = None,
+        data: Any = None,
+    ) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO journal (event, phase, simulation_id, data, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    event,
+                    phase,
+                    simulation_id,
+                    json.dumps(data, default=str),
+                    datetime.now().isoformat(),
+                ),
+            )
+
+    def state(self, event: str) -> Dict:
+        """
+        Return the simulation_id of the latest simulation created for event and the
+        data of the phases this simulation passed.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT phase, simulation_id, data FROM journal "
+                "WHERE event = ? ORDER BY id",
+                (event,),
+            ).fetchall()
+
+        state = {"simulation_id": None, "phases": {}}
+        for phase, simulation_id, data in rows:
+            if phase == CREATED:
+                state = {"simulation_id": simulation_id, "phases": {}}
+            state["phases"][phase] = json.loads(data)
+        return state
+
+    def events(self, phase: str) -> List[str]:
+        """Return the events which passed phase, in order of passing it."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT event FROM journal WHERE phase = ? "
+                "GROUP BY event ORDER BY MIN(id)",
+                (phase,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+def open_journal(
+    results_dir: Path, threedimodel_id: int, organisation: str, resume: bool
+) -> Journal:
+    """
+    Open the journal in results_dir. When not resuming, the journal of a previous
+    batch is moved aside and a new batch is started.
+    """
+    path = results_dir / JOURNAL_FILENAME
+    if not resume and path.exists():
+        backup = path.with_name(
+            f"{path.stem}_{datetime.now().strftime('%Y%m%d%H%M%S')}{path.suffix}"
+        )
+        print(f"Moving journal of a previous batch to {backup}")
+        path.rename(backup)
+
+    journal = Journal(path)
+    batch = journal.state(BATCH)["phases"].get(STARTED)
+    if batch is None:
+        journal.record(
+            BATCH,
+            STARTED,
+            data={"threedimodel_id": threedimodel_id, "organisation": organisation},
+        )
+    elif batch["threedimodel_id"] != threedimodel_id:
+        journal.close()
+        raise ValueError(
+            f"Cannot resume, {path} belongs to ThreediModel {batch['threedimodel_id']}"
+        )
+    return journal
+
+
+def read_created_simulations(path: Path) -> Dict:
+    """
+    Read the batch information from a (running) batch journal in the format of the
+    created_simulations JSON file. Only queued rain event simulations are listed.
+    """
+    with Journal(path) as journal:
+        batch = journal.state(BATCH)["phases"].get(STARTED)
+        if batch is None:
+            raise ValueError(f"{path} does not contain a started batch")
+
+        rain_event_simulations = []
+        for event in journal.events(QUEUED):
+            if event in (BATCH, DWF):
+                continue
+            phases = journal.state(event)["phases"]
+            if QUEUED in phases:
+                rain_event_simulations.append(phases[CREATED])
+
+        dwf = journal.state(DWF)["phases"]
+
+    return {
+        "threedimodel_id": batch["threedimodel_id"],
+        "simulation_dwf": dwf.get(CREATED),
+        "rain_event_simulations": rain_event_simulations,
+        "saved_states": dwf.get(SAVED_STATES_CREATED, []),
+    }
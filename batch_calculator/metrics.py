@@ -0,0 +1,251 @@
+import json
+import threading
+
+from batch_calculator.rate_limit import TokenBucket
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from time import monotonic
+from typing import Callable, Dict, Optional
+
+# upper bounds of the API latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_PREFIX = "batch_calculator"
+
+
+class Metrics:
+    """
+    Thread-safe record of a run: the wall time of its phases and, per API
+    endpoint, the number of requests by outcome, a latency histogram and the
+    retries and throttled (429) requests. Bytes downloaded and uploaded are
+    counted as well.
+
+    Phases may overlap, e.g. with --pipeline. The totals of a phase are the
+    requests and bytes of all threads during its wall time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = datetime.now()
+        self.start = monotonic()
+        self.phases = []
+        self.endpoints = {}
+        self.totals = Counter()
+        self.profiler = None  # a PhaseProfiler, see profiling.py
+
+    def request(self, endpoint: str, latency: float, outcome: str) -> None:
+        """Record an API request, outcome is "ok", the HTTP status or "error"."""
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    "requests": 0,
+                    "outcomes": Counter(),
+                    "retries": 0,
+                    "throttled": 0,
+                    "latency_sum": 0.0,
+                    "latency_counts": [0] * (len(LATENCY_BUCKETS) + 1),
+                }
+            stats["requests"] += 1
+            stats["outcomes"][outcome] += 1
+            stats["latency_sum"] += latency
+            stats["latency_counts"][bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self.totals["api_requests"] += 1
+
+    def count(self, endpoint: str, counter: str) -> None:
+        """Count a retry or throttled request of endpoint."""
+        with self.lock:
+            self.endpoints[endpoint][counter] += 1
+            self.totals[counter] += 1
+
+    def transferred(self, direction: str, nbytes: int) -> None:
+        """Count nbytes "downloaded" or "uploaded"."""
+        with self.lock:
+            self.totals[f"{direction}_bytes"] += nbytes
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Record the wall time and totals of the code run in the context. It is
+        profiled as well when a profiler is set.
+        """
+        start = monotonic()
+        with self.lock:
+            totals = Counter(self.totals)
+        try:
+            with self.profiler.phase(name) if self.profiler else nullcontext():
+                yield
+        finally:
+            with self.lock:
+                self.phases.append(
+                    {
+                        "name": name,
+                        "start": start - self.start,
+                        "duration": monotonic() - start,
+                        **{
+                            counter: self.totals[counter] - totals[counter]
+                            for counter in (
+                                "api_requests",
+                                "retries",
+                                "throttled",
+                                "downloaded_bytes",
+                                "uploaded_bytes",
+                            )
+                        },
+                    }
+                )
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """Wrap function to run as phase name, e.g. in another thread."""
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def to_dict(self, rate_limit: Optional[Dict] = None) -> Dict:
+        with self.lock:
+            return {
+                "started": self.started.isoformat(timespec="seconds"),
+                "duration": monotonic() - self.start,
+                "phases": [dict(phase) for phase in self.phases],
+                "endpoints": {
+                    endpoint: {
+                        "requests": stats["requests"],
+                        "outcomes": dict(stats["outcomes"]),
+                        "retries": stats["retries"],
+                        "throttled": stats["throttled"],
+                        "latency": {
+                            "sum": stats["latency_sum"],
+                            "buckets": dict(
+                                zip(
+                                    [str(le) for le in LATENCY_BUCKETS] + ["+Inf"],
+                                    stats["latency_counts"],
+                                )
+                            ),
+                        },
+                    }
+                    for endpoint, stats in sorted(self.endpoints.items())
+                },
+                "totals": dict(self.totals),
+                "rate_limit": rate_limit or {},
+            }
+
+    @contextmanager
+    def recording(
+        self, results_dir: Path, command: str, rate_limit: Optional[TokenBucket] = None
+    ):
+        """Write the metrics when leaving the context, also when the run fails."""
+        try:
+            yield self
+        finally:
+            self.write(results_dir, command, rate_limit.stats() if rate_limit else None)
+
+    def write(
+        self, results_dir: Path, command: str, rate_limit: Optional[Dict] = None
+    ) -> None:
+        """
+        Write the metrics to {command}_metrics.json and, in the Prometheus text
+        format, {command}_metrics.prom in results_dir.
+        """
+        data = dict(self.to_dict(rate_limit), command=command)
+        path = Path(results_dir, f"{command.replace('-', '_')}_metrics.json")
+        with path.open("w") as f:
+            json.dump(data, f, indent=4)
+        with path.with_suffix(".prom").open("w") as f:
+            f.write(prometheus_text(data))
+        print(f"Writing metrics to {path}")
+
+
+def prometheus_text(data: Dict) -> str:
+    """Format the metrics of Metrics.to_dict in the Prometheus text format."""
+    lines = []
+    command = data["command"]
+
+    def metric(name, kind, description, samples):
+        lines.append(f"# HELP {METRICS_PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+        for suffix, labels, value in samples:
+            labels = ",".join(
+                f'{key}="{value}"'
+                for key, value in dict(command=command, **labels).items()
+            )
+            lines.append(f"{METRICS_PREFIX}_{name}{suffix}{{{labels}}} {value}")
+
+    metric(
+        "duration_seconds",
+        "gauge",
+        "Wall time of the run.",
+        [("", {}, data["duration"])],
+    )
+    metric(
+        "phase_duration_seconds",
+        "gauge",
+        "Wall time per phase.",
+        [("", {"phase": phase["name"]}, phase["duration"]) for phase in data["phases"]],
+    )
+    metric(
+        "phase_api_requests",
+        "gauge",
+        "API requests during a phase.",
+        [
+            ("", {"phase": phase["name"]}, phase["api_requests"])
+            for phase in data["phases"]
+        ],
+    )
+    metric(
+        "api_requests_total",
+        "counter",
+        "API requests per endpoint and outcome.",
+        [
+            ("", {"endpoint": endpoint, "outcome": outcome}, count)
+            for endpoint, stats in data["endpoints"].items()
+            for outcome, count in stats["outcomes"].items()
+        ],
+    )
+    for counter, description in (
+        ("retries", "API requests retried per endpoint."),
+        ("throttled", "API requests throttled (429) per endpoint."),
+    ):
+        metric(
+            f"api_{counter}_total",
+            "counter",
+            description,
+            [
+                ("", {"endpoint": endpoint}, stats[counter])
+                for endpoint, stats in data["endpoints"].items()
+            ],
+        )
+    samples = []
+    for endpoint, stats in data["endpoints"].items():
+        cumulative = 0
+        for le, count in stats["latency"]["buckets"].items():
+            cumulative += count
+            samples.append(("_bucket", {"endpoint": endpoint, "le": le}, cumulative))
+        samples.append(("_sum", {"endpoint": endpoint}, stats["latency"]["sum"]))
+        samples.append(("_count", {"endpoint": endpoint}, stats["requests"]))
+    metric(
+        "api_request_duration_seconds",
+        "histogram",
+        "API request latency per endpoint.",
+        samples,
+    )
+    metric(
+        "transferred_bytes_total",
+        "counter",
+        "Bytes of files downloaded and uploaded.",
+        [
+            ("", {"direction": direction}, data["totals"].get(f"{direction}_bytes", 0))
+            for direction in ("downloaded", "uploaded")
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+# Shared by the whole run, see rain_series_simulations.api_call
+run_metrics = Metrics()
@@ -0,0 +1,129 @@
+import heapq
+import itertools
+
+from time import monotonic, sleep
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+MIN_POLL_INTERVAL = 5  # seconds
+MAX_POLL_INTERVAL = 120  # seconds
+MAX_POLL_RATE = 5  # polls per second
+
+
+class PollScheduler:
+    """
+    Schedule status polls for a set of keys, e.g. simulation ids.
+
+    Iterating over the scheduler yields keys when they are due, until all keys are
+    removed. A yielded key is polled again after an exponentially growing interval,
+    between min_interval and max_interval. Reporting its progress with update()
+    schedules the next poll around the expected completion time instead. The time
+    between two polls is at least 1 / max_rate seconds.
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[Hashable] = (),
+        min_interval: float = MIN_POLL_INTERVAL,
+        max_interval: float = MAX_POLL_INTERVAL,
+        max_rate: float = MAX_POLL_RATE,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_spacing = 1 / max_rate
+        self.last_poll = float("-inf")
+        self.queue = []
+        self.counter = itertools.count()
+        self.next_poll: Dict[Hashable, float] = {}
+        self.interval: Dict[Hashable, float] = {}
+        self.progress: Dict[Hashable, Tuple[float, float]] = {}
+        for key in keys:
+            self.add(key)
+
+    def __len__(self) -> int:
+        return len(self.next_poll)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        while len(self.queue) > 0:
+            key = self.poll()
+            if key is not None:
+                yield key
+
+    def due_in(self) -> float:
+        """Return the seconds until the next poll is due, inf without keys."""
+        while len(self.queue) > 0 and self.next_poll.get(self.queue[0][2]) != (
+            self.queue[0][0]
+        ):
+            heapq.heappop(self.queue)  # removed or rescheduled
+        if len(self.queue) == 0:
+            return float("inf")
+        return max(self.queue[0][0], self.last_poll + self.min_spacing) - monotonic()
+
+    def due(self, within: float = 0) -> List[Hashable]:
+        """Return the keys of which the next poll is due within seconds."""
+        deadline = monotonic() + within
+        return [key for key, due in self.next_poll.items() if due <= deadline]
+
+    def poll(self, timeout: Optional[float] = None) -> Optional[Hashable]:
+        """
+        Return the next due key, waiting for it at most timeout seconds (or until
+        it is due when timeout is None). Returns None when no key is due in time.
+        """
+        wait = self.due_in()
+        if wait == float("inf") or (timeout is not None and wait > timeout):
+            if timeout:
+                sleep(timeout)
+            return None
+        if wait > 0:
+            sleep(wait)
+        self.last_poll = monotonic()
+
+        _, _, key = heapq.heappop(self.queue)
+        # back off until the caller reports progress
+        self.interval[key] = min(self.interval[key] * 2, self.max_interval)
+        self.schedule(key, self.interval[key])
+        return key
+
+    def schedule(self, key: Hashable, delay: float) -> None:
+        self.next_poll[key] = monotonic() + delay
+        heapq.heappush(self.queue, (self.next_poll[key], next(self.counter), key))
+
+    def add(self, key: Hashable, delay: float = 0) -> None:
+        self.interval[key] = self.min_interval / 2
+        self.schedule(key, delay)
+
+    def remove(self, key: Hashable) -> None:
+        self.next_poll.pop(key, None)
+        self.interval.pop(key, None)
+        self.progress.pop(key, None)
+
+    def update(self, key: Hashable, percentage: Optional[float]) -> None:
+        """
+        Schedule the next poll of key from its progress percentage. The remaining
+        time is extrapolated from the progress since the previous update, the next
+        poll is at half of the remaining time.
+        """
+        if key not in self.next_poll or percentage is None:
+            return
+
+        now = monotonic()
+        previous = self.progress.get(key)
+        self.progress[key] = (now, percentage)
+        if percentage >= 100:
+            delay = self.min_interval
+        elif previous is not None and percentage > previous[1]:
+            rate = (percentage - previous[1]) / (now - previous[0])
+            delay = (100 - percentage) / rate / 2
+        else:
+            return
+
+        delay = min(max(delay, self.min_interval), self.max_interval)
+        self.interval[key] = delay
+        self.schedule(key, delay)
@@ -6,80 +6,100 @@ import pandas
 import shutil
 import zipfile
 
+from batch_calculator.artifacts import (
+    ArtifactCache,
+    artifact_key,
+    DEFAULT_ARTIFACT_CACHE_DIR,
+    DEFAULT_ARTIFACT_CACHE_SIZE,
+    link_artifact,
+)
+from batch_calculator.downloads import download_file, file_complete
+from batch_calculator.journal import FINISHED, read_created_simulations
+from batch_calculator.metrics import run_metrics
+from batch_calculator.polling import PollScheduler
+from batch_calculator.profiling import PhaseProfiler, PROFILE_DIRNAME
+from batch_calculator.progress import (
+    CRASHED,
+    DOWNLOAD,
+    DOWNLOADED,
+    FAILED,
+    PROGRESS_LOG_FILENAME,
+    run_progress,
+    RUNNING,
+)
 from batch_calculator.rain_series_simulations import (
-    printProgressBar,
     api_call,
+    api_rate_limit,
+    API_MAX_REQUESTS_PER_SECOND,
+    TIMEOUT,
+)
+from batch_calculator.return_periods import (
+    DEFAULT_RETURN_PERIODS,
+    return_period_volumes,
+)
+from batch_calculator.statuses import StatusCache
+from batch_calculator.weir_cache import (
+    CACHE_FILENAME,
+    cached_rows,
+    load_weir_cache,
+    save_weir_cache,
 )
-from math import floor
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import nullcontext
+from functools import partial
 from pathlib import Path
 from threedi_api_client import ThreediApi
 from threedi_api_client.openapi.models import SimulationStatus
 from threedi_api_client.versions import V3BetaApi
 from typing import (
+    Callable,
     Dict,
     List,
+    Optional,
+    Sequence,
+    Tuple,
 )
 from threedigrid.admin.gridresultadmin import GridH5AggregateResultAdmin
-from urllib.request import urlretrieve
+from time import monotonic
 
 
-def repetition_time_volumes(weir_results, n, stats=[1, 2, 5, 10]):
+def repetition_time_volumes(weir_results, n, stats=DEFAULT_RETURN_PERIODS):
     """
     Created on Mon May 18 14:09:04 2020
 
     @author: Emile.deBadts
+
+    Volumes of a single weir for return periods stats in a series of n years, see
+    return_periods.return_period_volumes.
     """
-    sorted_weir_results = sorted(list(weir_results), reverse=True)
-    if n == 10:
-        T_volume_list = []
-        for T in stats:
-            if T == 5:
-                volume = sorted_weir_results[1] - 0.48 * (
-                    sorted_weir_results[1] - sorted_weir_results[2]
-                )
-                T_volume_list += [volume]
-            elif T == 10:
-                volume = sorted_weir_results[0] - 0.46 * (
-                    sorted_weir_results[0] - sorted_weir_results[1]
-                )
-                T_volume_list += [volume]
-            else:
-                T_volume_list += [sorted_weir_results[int(n / T) - 1]]
-
-    if n == 25:
-        T_volume_list = []
-        for T in stats:
-            if (n / T).is_integer():
-                T_volume_list += [sorted_weir_results[int(n / T) - 1]]
-            else:
-                volume = sorted_weir_results[floor(n / T) - 1] - 0.5 * (
-                    sorted_weir_results[floor(n / T) - 1]
-                    - sorted_weir_results[floor(n / T)]
-                )
-                T_volume_list += [volume]
+    volumes = return_period_volumes(np.asarray(weir_results)[:, np.newaxis], n, stats)
+    return list(volumes[:, 0])
+
 
-    return T_volume_list
+def read_weir_pks(gridadmin: str, aggregate_file: Path) -> np.ndarray:
+    """Read the ids of the weirs, in the order of their results."""
+    ga = GridH5AggregateResultAdmin(gridadmin, aggregate_file)
+    try:
+        return ga.lines.weirs.content_pk
+    finally:
+        ga.netcdf_file.close()
+        ga.h5py_file.close()
 
 
-def batch_calculation_statistics(netcdf_dir: Path, gridadmin: str, nr_years: int):
+def read_weir_results(
+    gridadmin: str, aggregate_file: Path
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Compute weir statistics from netcdf files
-    @author: Emile.deBadts
+    Read the absolute cumulative (negative and positive) discharge of all weirs
+    at the last timestep of an aggregation netcdf.
     """
-    print("Processing statistics...")
-
-    # Setup result pandas dataframe
-    nc_files = [file for file in os.listdir(netcdf_dir) if file.endswith(".nc")]
-    ga = GridH5AggregateResultAdmin(gridadmin, netcdf_dir / nc_files[0])
-    weir_pks = ga.lines.weirs.content_pk
-    results_cum = pandas.DataFrame(columns=["aggregate_netcdf", *weir_pks])
-    results_cum_negative = pandas.DataFrame(columns=["aggregate_netcdf", *weir_pks])
-    results_cum_positive = pandas.DataFrame(columns=["aggregate_netcdf", *weir_pks])
-    nan_results = {}
-
-    # Get cumulative discharge for all weirs
-    for i, aggregate_file in enumerate(nc_files):
-        ga = GridH5AggregateResultAdmin(gridadmin, netcdf_dir / aggregate_file)
+    ga = GridH5AggregateResultAdmin(gridadmin, aggregate_file)
+    try:
         weir_data = ga.lines.filter(content_type="v2_weir").only(
             "content_pk",
             "content_type",
@@ -87,107 +107,410 @@ def batch_calculation_statistics(netcdf_dir: Path, gridadmin: str, nr_years: int
             "q_cum_negative",
             "q_cum_positive",
         )
-        cumulative_discharge = [abs(x) for x in (weir_data.q_cum)[-1]]
-        negative_discharge = [abs(x) for x in (weir_data.q_cum_negative)[-1]]
-        positive_discharge = [abs(x) for x in (weir_data.q_cum_positive)[-1]]
-        results_cum.loc[i] = [aggregate_file, *cumulative_discharge]
-        results_cum_negative.loc[i] = [aggregate_file, *negative_discharge]
-        results_cum_positive.loc[i] = [aggregate_file, *positive_discharge]
+        return (
+            np.abs(weir_data.q_cum[-1]),
+            np.abs(weir_data.q_cum_negative[-1]),
+            np.abs(weir_data.q_cum_positive[-1]),
+        )
+    finally:
+        ga.netcdf_file.close()
+        ga.h5py_file.close()
+
+
+def batch_calculation_statistics(
+    netcdf_dir: Path,
+    gridadmin: str,
+    nr_years: int,
+    workers: int = 1,
+    return_periods: Sequence[float] = DEFAULT_RETURN_PERIODS,
+    cache: bool = True,
+):
+    """
+    Compute weir statistics from netcdf files
+    @author: Emile.deBadts
+
+    With workers > 1 the netcdf files are read by a pool of worker processes. With
+    cache, the extracted weir results are stored next to netcdf_dir and only new or
+    changed netcdf files are read on the next run.
+    """
+    print("Processing statistics...")
+
+    nc_files = sorted(file for file in os.listdir(netcdf_dir) if file.endswith(".nc"))
+    if len(nc_files) == 0:
+        raise ValueError(f"No aggregation netcdfs found in {netcdf_dir}")
+    paths = [netcdf_dir / aggregate_file for aggregate_file in nc_files]
+    cache_path = netcdf_dir.parent / CACHE_FILENAME
+    weir_cache = load_weir_cache(cache_path, gridadmin) if cache else None
+    rows = cached_rows(weir_cache, paths)
+    missing = np.flatnonzero(rows == -1)
+    if len(missing) == 0:
+        weir_pks = weir_cache["weir_pks"]
+    else:
+        weir_pks = read_weir_pks(gridadmin, paths[missing[0]])
+        if weir_cache is not None and not np.array_equal(
+            weir_pks, weir_cache["weir_pks"]
+        ):
+            rows[:] = -1
+            missing = np.arange(len(paths))
+
+    # Setup result arrays, one row per netcdf and one column per weir
+    shape = (len(nc_files), len(weir_pks))
+    results_cum = np.empty(shape, dtype=np.float64)
+    results_cum_negative = np.empty(shape, dtype=np.float64)
+    results_cum_positive = np.empty(shape, dtype=np.float64)
+
+    cached = np.flatnonzero(rows != -1)
+    if len(cached) > 0:
+        results_cum[cached] = weir_cache["cum"][rows[cached]]
+        results_cum_negative[cached] = weir_cache["cum_negative"][rows[cached]]
+        results_cum_positive[cached] = weir_cache["cum_positive"][rows[cached]]
+        print(f"Using cached weir results for {len(cached)} of {len(paths)} netcdfs")
+
+    # Get cumulative discharge for all weirs
+    read = partial(read_weir_results, gridadmin)
+    missing_paths = [paths[i] for i in missing]
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(missing_paths) // (workers * 4))
+        weir_results = executor.map(read, missing_paths, chunksize=chunksize)
+    else:
+        # read in this process, without an idle pool
+        executor = nullcontext()
+        weir_results = map(read, missing_paths)
+    with executor:
+        for i, (cum, cum_negative, cum_positive) in zip(missing, weir_results):
+            results_cum[i] = cum
+            results_cum_negative[i] = cum_negative
+            results_cum_positive[i] = cum_positive
+
+    if cache and (len(missing) > 0 or len(paths) != len(weir_cache["nc_files"])):
+        save_weir_cache(
+            cache_path,
+            gridadmin,
+            paths,
+            weir_pks,
+            results_cum,
+            results_cum_negative,
+            results_cum_positive,
+        )
+
+    return weir_statistics(
+        nc_files,
+        weir_pks,
+        results_cum,
+        results_cum_negative,
+        results_cum_positive,
+        nr_years,
+        return_periods,
+        netcdf_dir.parent,
+    )
 
+
+def weir_statistics(
+    nc_files: List[str],
+    weir_pks: np.ndarray,
+    results_cum: np.ndarray,
+    results_cum_negative: np.ndarray,
+    results_cum_positive: np.ndarray,
+    nr_years: int,
+    return_periods: Sequence[float],
+    results_dir: Path,
+) -> pandas.DataFrame:
+    """
+    Compute the statistics per weir from the events x weirs arrays of cumulative
+    discharge. Weirs with NaN results are listed in nan_rows.json in results_dir.
+    """
     # Find results for each weir
+    nan_rows = np.isnan(results_cum)
+    nc_files = np.array(nc_files)
+    nan_results = {
+        int(weir): nc_files[nan_rows[:, j]]
+        for j, weir in enumerate(weir_pks)
+        if nan_rows[:, j].any()
+    }
+
+    weir_tx = return_period_volumes(results_cum, nr_years, return_periods)
+    if np.isnan(weir_tx).all(axis=1).any():
+        print(
+            f"WARNING: not all return periods {return_periods} can be computed from "
+            f"{len(nc_files)} events in {nr_years} years, these columns are empty."
+        )
+
+    frequency = (results_cum > 0).sum(axis=0) / nr_years
+    average_volume = results_cum.sum(axis=0) / nr_years
+    negative_discharge_freq = (results_cum_negative > 0).sum(axis=0) / nr_years
+    negative_discharge_vol = results_cum_negative.sum(axis=0) / nr_years
+    positive_discharge_freq = (results_cum_positive > 0).sum(axis=0) / nr_years
+    positive_discharge_vol = results_cum_positive.sum(axis=0) / nr_years
+
     output = pandas.DataFrame(
-        columns=[
-            "weir_id",
-            "frequency (active/year)",
-            "average_volume (m3/year)",
-            "negative_discharge_frequency (active/year)",
-            "average_negative_discharge (m3/year)",
-            "positive_discharge_frequency (active/year)",
-            "average_positive discharge (m3/year)",
-            "t1 (m3)",
-            "t2 (m3)",
-            "t5 (m3)",
-            "t10 (m3)",
-        ]
+        {
+            "weir_id": weir_pks,
+            "frequency (active/year)": frequency,
+            "average_volume (m3/year)": average_volume,
+            "negative_discharge_frequency (active/year)": negative_discharge_freq,
+            "average_negative_discharge (m3/year)": negative_discharge_vol,
+            "positive_discharge_frequency (active/year)": positive_discharge_freq,
+            "average_positive discharge (m3/year)": positive_discharge_vol,
+            **{f"t{T:g} (m3)": weir_tx[i] for i, T in enumerate(return_periods)},
+        }
     )
 
-    for i, weir in enumerate(results_cum.columns[1:]):
-        nan_rows = results_cum[results_cum[weir].isnull()]
-        if len(nan_rows) > 0:
-            nan_results[int(weir)] = nan_rows["aggregate_netcdf"].values
-
-        frequency = sum(results_cum[weir] > 0) / nr_years
-        average_volume = sum(results_cum[weir]) / nr_years
-        negative_discharge_freq = sum(results_cum_negative[weir] > 0) / nr_years
-        negative_discharge_vol = sum(results_cum_negative[weir]) / nr_years
-        positive_discharge_freq = sum(results_cum_positive[weir] > 0) / nr_years
-        positive_discharge_vol = sum(results_cum_positive[weir]) / nr_years
-        weir_tx_list = [
-            *repetition_time_volumes(weir_results=results_cum[weir], n=nr_years)
-        ]
-
-        output.loc[i] = [
-            weir,
-            frequency,
-            average_volume,
-            negative_discharge_freq,
-            negative_discharge_vol,
-            positive_discharge_freq,
-            positive_discharge_vol,
-            *weir_tx_list,
-        ]
-
     if len(nan_results) > 0:
         print(
             "WARNING: one or more weirs found which have NaN results in their cumulative "
             "discharge. Please check the nan_rows.json file for more information. "
             "This file contains weir id and netcdf file where the NaN values are found. "
         )
-        results_file = netcdf_dir.parent / "nan_rows.json"
+        results_file = results_dir / "nan_rows.json"
         with results_file.open("w") as f:
             json.dump(nan_results, f, indent=4, default=str)
 
     return output
 
 
+class WeirResultsStream:
+    """
+    Extract the weir results of aggregation netcdfs as they arrive, on a pool of
+    worker processes, into running events x weirs arrays. With delete, every netcdf
+    is removed once its weir results are extracted.
+    """
+
+    def __init__(
+        self, gridadmin: str, nr_events: int, workers: int = 1, delete: bool = False
+    ):
+        self.gridadmin = gridadmin
+        self.nr_events = nr_events
+        self.delete = delete
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = {}  # extraction future -> netcdf path
+        self.nc_files = []
+        self.weir_pks = None
+        self.results = None  # cum, cum_negative and cum_positive arrays
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        # shutdown(cancel_futures=True) needs Python 3.9
+        for future in self.pending:
+            future.cancel()
+        self.executor.shutdown()
+
+    def add(self, path: Path) -> None:
+        if self.weir_pks is None:
+            self.weir_pks = read_weir_pks(self.gridadmin, path)
+        future = self.executor.submit(read_weir_results, self.gridadmin, path)
+        self.pending[future] = path
+        self.collect()
+
+    def collect(self, timeout: Optional[float] = 0) -> None:
+        """Store the results of finished extractions, waiting at most timeout."""
+        done, _ = wait(self.pending, timeout=timeout)
+        for future in done:
+            path = self.pending.pop(future)
+            weir_results = future.result()
+            if self.results is None:
+                shape = (self.nr_events, len(weir_results[0]))
+                self.results = [np.empty(shape, dtype=np.float64) for _ in range(3)]
+            for results, row in zip(self.results, weir_results):
+                results[len(self.nc_files)] = row
+            self.nc_files.append(path.name)
+            if self.delete:
+                path.unlink()
+
+    def statistics(
+        self, nr_years: int, return_periods: Sequence[float], results_dir: Path
+    ) -> pandas.DataFrame:
+        """Wait for all extractions and compute the weir statistics."""
+        self.collect(timeout=None)
+        if len(self.nc_files) == 0:
+            raise ValueError("No aggregation netcdfs have been processed")
+
+        # same event order as batch_calculation_statistics
+        order = np.argsort(self.nc_files)
+        return weir_statistics(
+            [self.nc_files[i] for i in order],
+            self.weir_pks,
+            *[results[: len(self.nc_files)][order] for results in self.results],
+            nr_years,
+            return_periods,
+            results_dir,
+        )
+
+
+def parse_return_periods(ctx, param, value) -> List[float]:
+    """Parse a comma separated list of return periods."""
+    try:
+        return_periods = [float(T) for T in value.split(",")]
+    except ValueError:
+        raise click.BadParameter("should be a comma separated list of numbers")
+    if any(T <= 0 for T in return_periods):
+        raise click.BadParameter("return periods should be larger than 0")
+    return return_periods
+
+
+def download_result_file(
+    api: V3BetaApi, result, simulation_id: int, path: Path, sync: bool = False
+) -> Optional[int]:
+    """
+    Download a result file of a simulation to path and return the number of
+    downloaded bytes. With sync a complete file from a previous run is kept and
+    None is returned.
+    """
+    if sync and file_complete(path, result.file.size, result.file.etag):
+        return None
+    download = api_call(
+        api.simulations_results_files_download, result.id, simulation_id
+    )
+    return download_file(download.get_url, path, result.file.size, result.file.etag)
+
+
+def download_log_files(
+    api: V3BetaApi, result, simulation_id: int, sim_dir: Path, sync: bool = False
+) -> Optional[int]:
+    """Download the zipped log files of a simulation and unzip them in sim_dir."""
+    nbytes = download_result_file(
+        api, result, simulation_id, sim_dir / result.filename, sync
+    )
+    if nbytes is not None:
+        with zipfile.ZipFile(
+            sim_dir / f"log_files_sim_{simulation_id}.zip", "r"
+        ) as zip:
+            zip.extractall(sim_dir)
+    return nbytes
+
+
 def download_results(
     api: V3BetaApi,
     rain_event_simulations: List[Dict],
     results_dir: Path,
     threedimodel_id: int,
     debug: bool,
+    download_workers: int = 4,
+    on_aggregation: Optional[Callable[[Path], None]] = None,
+    sync: bool = False,
+    artifact_cache: Optional[ArtifactCache] = None,
 ) -> None:
     """
     Download results by checking remaining simulations for uploaded files.
     Place aggregation netcdfs in /aggregation_netcdf folder.
     Place other result files in simulation-{id} folder.
-    """
 
-    # First clean results dir
-    for file in results_dir.iterdir():
-        if file.is_dir():
-            shutil.rmtree(Path(results_dir, file))
+    Without sync the result folders are removed first. With sync files from a
+    previous run are kept when their size and checksum match the API file metadata,
+    only missing or corrupt files are downloaded and interrupted downloads are
+    resumed. With an artifact_cache the gridadmin is only downloaded once per model
+    revision.
+
+    The remaining simulations are polled by a PollScheduler, their statuses are
+    fetched in bulk by a StatusCache. Files are downloaded
+    by a pool of download_workers threads, so polling continues while transfers
+    are in flight. on_aggregation is called with the path of every downloaded
+    aggregation netcdf.
+    """
 
     aggregation_dir = results_dir / "aggregation_netcdfs"
-    aggregation_dir.mkdir()
-
     simulations_dir = results_dir / "simulations"
-    remaining = [(sim["id"], sim["name"]) for sim in rain_event_simulations]
+    if sync:
+        # Remove aggregation netcdfs of simulations that are not part of the batch
+        aggregation_dir.mkdir(exist_ok=True)
+        expected = {
+            f"aggregate_results_3di_sim_{sim['id']}.nc"
+            for sim in rain_event_simulations
+        }
+        for file in aggregation_dir.iterdir():
+            if file.suffix == ".nc" and file.name not in expected:
+                file.unlink()
+    else:
+        # First clean the result folders of a previous run, other folders in the
+        # results dir (e.g. profile) are kept
+        for directory in (aggregation_dir, simulations_dir):
+            if directory.is_dir():
+                shutil.rmtree(directory)
+        aggregation_dir.mkdir()
+
+    # Download gridadmin, which is needed to process the aggregation netcdfs
+    gridadmin_path = Path(results_dir, "gridadmin").with_suffix(".h5")
+
+    def download_gridadmin(path: Path) -> None:
+        download = api_call(api.threedimodels_gridadmin_download, threedimodel_id)
+        if not (sync and file_complete(path, download.size, download.etag)):
+            download_file(download.get_url, path, download.size, download.etag)
+
+    with run_metrics.phase("download_gridadmin"):
+        if artifact_cache is None:
+            download_gridadmin(gridadmin_path)
+        else:
+            threedimodel = api_call(api.threedimodels_read, threedimodel_id)
+            key = artifact_key(threedimodel_id, threedimodel.revision_id)
+            cached = artifact_cache.fetch(key, gridadmin_path.name, download_gridadmin)
+            link_artifact(cached, gridadmin_path)
+
+    simulations = {sim["id"]: sim for sim in rain_event_simulations}
+    # statuses are fetched in bulk, so polls are only limited by the API rate limit
+    remaining = PollScheduler(simulations, max_rate=float("inf"))
+    statuses = StatusCache(api, simulations, remaining)
     crashes = []
+    failures = []  # simulations of which a result file could not be downloaded
     total = len(rain_event_simulations)
-    while len(remaining) > 0:
-        for simulation in remaining:
-            simulation_id: int = simulation[0]
-            isahw: str = simulation[1].split("isahw")[1]
-            printProgressBar(total - len(remaining), total, "Downloading result files")
-            status: SimulationStatus = api_call(
-                api.simulations_status_list, simulation_id
-            )
+    in_flight = {}  # download future -> simulation id, aggregation netcdf path
+    downloaded_bytes = 0
+    skipped = 0
+    start = monotonic()
+
+    def collect_downloads(timeout=0):
+        nonlocal downloaded_bytes, skipped
+        done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            simulation_id, aggregation_path = in_flight.pop(future)
+            try:
+                nbytes = future.result()
+            except Exception as e:
+                # keep downloading the others, a --sync run resumes this file
+                run_progress.state(FAILED, simulation_id, error=str(e))
+                failures.append(
+                    (simulation_id, simulations[simulation_id]["name"], str(e))
+                )
+                continue
+            downloaded_bytes += nbytes or 0
+            if aggregation_path is not None:
+                if nbytes is None:
+                    skipped += 1
+                run_progress.state(DOWNLOADED, simulation_id, skipped=nbytes is None)
+                if on_aggregation is not None:
+                    on_aggregation(aggregation_path)
+
+    def show_progress():
+        busy = len({simulation_id for simulation_id, _ in in_flight.values()})
+        speed = downloaded_bytes / 1e6 / max(monotonic() - start, 1e-9)
+        run_progress.update(
+            DOWNLOAD,
+            total - len(remaining) - busy,
+            note=f"{speed:.2f} MB/s, {len(in_flight)} in flight",
+            download_speed=speed,
+            downloads_in_flight=len(in_flight),
+            downloaded_bytes=downloaded_bytes,
+        )
+
+    with run_progress.phase(
+        DOWNLOAD, total, "Downloading result files"
+    ), ThreadPoolExecutor(max_workers=download_workers) as executor:
+        for simulation_id in remaining:
+            simulation = simulations[simulation_id]
+            isahw: str = simulation["name"].split("isahw")[1]
+            collect_downloads()
+            show_progress()
+            status: SimulationStatus = statuses.get(simulation_id)
             if status.name == "crashed":
-                remaining.remove(simulation)
-                crashes.append(simulation)
+                run_progress.state(CRASHED, simulation_id)
+                remaining.remove(simulation_id)
+                statuses.remove(simulation_id)
+                crashes.append((simulation_id, simulation["name"]))
             elif status.name == "finished":
+                run_progress.state(FINISHED, simulation_id)
                 # wait for files to be uploaded
+                remaining.update(simulation_id, 100)
                 results = api_call(
                     api.simulations_results_files_list, simulation_id
                 ).results
@@ -198,52 +521,55 @@ def download_results(
                 ):
                     continue
 
-                remaining.remove(simulation)
+                remaining.remove(simulation_id)
+                statuses.remove(simulation_id)
                 for result in results:
+                    # files of a previous run are verified by the pool as well
                     if result.filename.startswith("agg"):
-                        download = api_call(
-                            api.simulations_results_files_download,
-                            *(
-                                result.id,
-                                simulation_id,
-                            ),
-                        )
-                        urlretrieve(
-                            download.get_url,
-                            Path(
-                                aggregation_dir,
-                                f"aggregate_results_3di_sim_{simulation_id}",
-                            ).with_suffix(".nc"),
+                        path = Path(
+                            aggregation_dir,
+                            f"aggregate_results_3di_sim_{simulation_id}",
+                        ).with_suffix(".nc")
+                        future = executor.submit(
+                            download_result_file,
+                            api,
+                            result,
+                            simulation_id,
+                            path,
+                            sync,
                         )
+                        in_flight[future] = (simulation_id, path)
 
                     if debug and result.filename.startswith("log"):
                         "Download log files and unzip"
                         sim_dir = simulations_dir / f"{simulation_id}-isahw{isahw}"
-                        sim_dir.mkdir(parents=True)
-                        download = api_call(
-                            api.simulations_results_files_download,
-                            *(
-                                result.id,
-                                simulation_id,
-                            ),
+                        sim_dir.mkdir(parents=True, exist_ok=sync)
+                        future = executor.submit(
+                            download_log_files,
+                            api,
+                            result,
+                            simulation_id,
+                            sim_dir,
+                            sync,
                         )
-                        urlretrieve(
-                            download.get_url,
-                            Path(sim_dir, result.filename),
-                        )
-                        with zipfile.ZipFile(
-                            sim_dir / f"log_files_sim_{simulation_id}.zip", "r"
-                        ) as zip:
-                            zip.extractall(sim_dir)
-
-    printProgressBar(total, total, "Downloading result files")
-
-    # Download gridadmin
-    download = api_call(api.threedimodels_gridadmin_download, threedimodel_id)
-    urlretrieve(
-        download.get_url,
-        Path(results_dir, "gridadmin").with_suffix(".h5"),
-    )
+                        in_flight[future] = (simulation_id, None)
+            elif status.time and simulation.get("duration"):
+                run_progress.state(RUNNING, simulation_id)
+                # running, estimate the progress from the simulated time
+                remaining.update(
+                    simulation_id, 100 * status.time / simulation["duration"]
+                )
+
+        # All simulations are done, wait for the last transfers
+        while len(in_flight) > 0:
+            collect_downloads(timeout=TIMEOUT)
+            show_progress()
+        show_progress()
+
+    speed = downloaded_bytes / 1e6 / max(monotonic() - start, 1e-9)
+    print(f"Downloaded {downloaded_bytes / 1e6:.1f} MB ({speed:.2f} MB/s)")
+    if skipped > 0:
+        print(f"Skipped {skipped} aggregation netcdfs that were already downloaded")
 
     # Carshes feedback
     if len(crashes) > 0:
@@ -254,6 +580,15 @@ def download_results(
         with results_file.open("w") as f:
             json.dump(crashes, f, indent=4, default=str)
 
+    if len(failures) > 0:
+        print(
+            f"WARNING: result files of {len(failures)} simulations could not be "
+            "downloaded, see failed_downloads.json"
+        )
+        results_file = results_dir / "failed_downloads.json"
+        with results_file.open("w") as f:
+            json.dump(failures, f, indent=4, default=str)
+
 
 @click.command()
 @click.argument(
@@ -288,45 +623,208 @@ def download_results(
     default=False,
     help="Skip downloading (aggregation) result files [default: False]",
 )
+@click.option(
+    "--sync",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Keep complete result files of a previous run and only download missing "
+    "or corrupt files [default: False]",
+)
+@click.option(
+    "--artifact-cache-dir",
+    type=click.Path(file_okay=False, writable=True, path_type=Path),
+    default=DEFAULT_ARTIFACT_CACHE_DIR,
+    help="Directory to cache model sqlites and gridadmins in "
+    "[default: $BATCH_CALCULATOR_CACHE_DIR or ~/.cache/batch-calculator]",
+)
+@click.option(
+    "--artifact-cache-size",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_ARTIFACT_CACHE_SIZE,
+    help="Maximum size of the artifact cache in GB, 0 disables the cache "
+    f"[default: {DEFAULT_ARTIFACT_CACHE_SIZE}]",
+)
+@click.option(
+    "--download-workers",
+    type=click.IntRange(min=1),
+    default=4,
+    help="Number of result files to download concurrently [default: 4]",
+)
+@click.option(
+    "--max-requests-per-second",
+    type=click.FloatRange(min=0, min_open=True),
+    default=API_MAX_REQUESTS_PER_SECOND,
+    help="Maximum number of API requests per second [default: 10]",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes used to read the aggregation netcdfs [default: 1]",
+)
+@click.option(
+    "--nr-years",
+    type=click.IntRange(min=1),
+    default=10,
+    help="Number of years covered by the rain series [default: 10]",
+)
+@click.option(
+    "--return-periods",
+    type=str,
+    default=",".join(str(T) for T in DEFAULT_RETURN_PERIODS),
+    callback=parse_return_periods,
+    help="Comma separated return periods in years [default: 1,2,5,10]",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help=f"Reuse weir results extracted in previous runs from {CACHE_FILENAME} "
+    "[default: True]",
+)
+@click.option(
+    "--stream",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Process aggregation netcdfs while downloading [default: False]",
+)
+@click.option(
+    "--delete-netcdfs",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Delete aggregation netcdfs once processed, with --stream [default: False]",
+)
+@click.option(
+    "--profile",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Profile CPU time and memory allocations per phase, written to the "
+    f"{PROFILE_DIRNAME} dir in results_dir (slows down the run) [default: False]",
+)
 def process_results(
     created_simulations: Path,
     host: str,
     apikey: str,
     debug: bool,
     skip_download: bool,
+    sync: bool,
+    artifact_cache_dir: Path,
+    artifact_cache_size: float,
+    download_workers: int,
+    max_requests_per_second: float,
+    workers: int,
+    nr_years: int,
+    return_periods: List[float],
+    cache: bool,
+    stream: bool,
+    delete_netcdfs: bool,
+    profile: bool,
 ):
     """
     Download and process the results of the rain series simulations.
     Input is the created_simulations-{date}.json file from rain_series_simulations.py
+    or the batch_journal.sqlite of a (still running) batch.
 
     debug option downloads log files per simulation.
+
+    sync option resumes the download of a previous run instead of starting over.
+
+    stream option processes every aggregation netcdf as soon as it is downloaded,
+    optionally removing it afterwards (delete-netcdfs option).
+
+    profile option profiles CPU time and memory allocations of every phase.
     """
+    if stream and skip_download:
+        raise click.UsageError("--stream cannot be combined with --skip-download")
+    if delete_netcdfs and not stream:
+        raise click.UsageError("--delete-netcdfs requires --stream")
+
+    api_rate_limit.configure(max_requests_per_second)
+    artifact_cache = None
+    if artifact_cache_size > 0:
+        artifact_cache = ArtifactCache(artifact_cache_dir, artifact_cache_size * 1e9)
     config = {
         "THREEDI_API_HOST": host,
         "THREEDI_API_PERSONAL_API_TOKEN": apikey,
     }
-    with ThreediApi(config=config, version="v3-beta") as api:
+    results_dir = created_simulations.absolute().parent
+    if profile:
+        run_metrics.profiler = PhaseProfiler(results_dir / PROFILE_DIRNAME)
+        if stream or workers > 1:
+            print(
+                "WARNING: the aggregation netcdfs are read in worker processes, "
+                "which are not profiled. Use --workers 1 without --stream to "
+                "profile reading them."
+            )
+    with run_metrics.recording(
+        results_dir, "process-rain-series-results", api_rate_limit
+    ), run_progress.logging(results_dir / PROGRESS_LOG_FILENAME), ThreediApi(
+        config=config, version="v3-beta"
+    ) as api:
         api: V3BetaApi
 
-        results_dir = created_simulations.absolute().parent
-        with Path(created_simulations).open("r") as f:
-            created_simulations = json.loads(f.read())
-
-        if not skip_download:
-            download_results(
-                api,
-                created_simulations["rain_event_simulations"],
-                results_dir,
-                created_simulations["threedimodel_id"],
-                debug,
-            )
+        if created_simulations.suffix == ".sqlite":
+            created_simulations = read_created_simulations(created_simulations)
+        else:
+            with Path(created_simulations).open("r") as f:
+                created_simulations = json.loads(f.read())
+
+        rain_event_simulations = created_simulations["rain_event_simulations"]
+        gridadmin = str(Path(results_dir, "gridadmin").with_suffix(".h5"))
+        if stream:
+            # Extract weir results from the aggregation netcdfs as they arrive
+            with WeirResultsStream(
+                gridadmin, len(rain_event_simulations), workers, delete_netcdfs
+            ) as weir_results:
+                with run_metrics.phase("download_results"):
+                    download_results(
+                        api,
+                        rain_event_simulations,
+                        results_dir,
+                        created_simulations["threedimodel_id"],
+                        debug,
+                        download_workers,
+                        on_aggregation=weir_results.add,
+                        sync=sync,
+                        artifact_cache=artifact_cache,
+                    )
+                print(f"API statistics: {api_rate_limit.stats()}")
+                print("Processing statistics...")
+                with run_metrics.phase("statistics"):
+                    statistics = weir_results.statistics(
+                        nr_years, return_periods, results_dir
+                    )
+        else:
+            if not skip_download:
+                with run_metrics.phase("download_results"):
+                    download_results(
+                        api,
+                        rain_event_simulations,
+                        results_dir,
+                        created_simulations["threedimodel_id"],
+                        debug,
+                        download_workers,
+                        sync=sync,
+                        artifact_cache=artifact_cache,
+                    )
+                print(f"API statistics: {api_rate_limit.stats()}")
+
+            # Calculate statistics
+            with run_metrics.phase("statistics"):
+                statistics = batch_calculation_statistics(
+                    netcdf_dir=Path(results_dir, "aggregation_netcdfs"),
+                    gridadmin=gridadmin,
+                    nr_years=nr_years,
+                    workers=workers,
+                    return_periods=return_periods,
+                    cache=cache,
+                )
 
-        # Calculate statistics
-        batch_calculation_statistics(
-            netcdf_dir=Path(results_dir, "aggregation_netcdfs"),
-            gridadmin=str(Path(results_dir, "gridadmin").with_suffix(".h5")),
-            nr_years=10,
-        ).to_csv(
+        statistics.to_csv(
             str(Path(results_dir, "batch_calculator_statistics").with_suffix(".csv")),
             index=False,
         )
@@ -0,0 +1,102 @@
+import cProfile
+import pstats
+import threading
+import tracemalloc
+
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic
+from typing import List
+
+PROFILE_DIRNAME = "profile"
+
+
+class PhaseProfiler:
+    """
+    Profile phases with cProfile and tracemalloc. Per phase {name}.prof (pstats),
+    {name}.tracemalloc (a tracemalloc.Snapshot taken at the end of the phase) and
+    a summary {name}.txt of the top functions and allocation sites are written to
+    directory, the summary is printed as well.
+
+    Only one phase is profiled at a time: phases started while another one is
+    profiled, nested or in another thread (e.g. dwf with --pipeline), are part of
+    it and not profiled on their own. Before Python 3.12 cProfile only sees the
+    thread running the phase, from 3.12 on all threads. Worker processes are never
+    profiled. The peak memory is that of all threads during the phase.
+    """
+
+    def __init__(self, directory: Path, top: int = 10):
+        self.directory = Path(directory)
+        self.top = top
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.lock.acquire(blocking=False):
+            yield
+            return
+
+        try:
+            # restart tracing for the peak of this phase, reset_peak needs 3.9
+            tracemalloc.stop()
+            tracemalloc.start()
+            profile = cProfile.Profile()
+            start = monotonic()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                duration = monotonic() - start
+                _, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot().filter_traces(
+                    (
+                        tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                        tracemalloc.Filter(False, "<unknown>"),
+                    )
+                )
+                tracemalloc.stop()
+                self.write(name, profile, snapshot, duration, peak)
+        finally:
+            self.lock.release()
+
+    def write(
+        self,
+        name: str,
+        profile: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        duration: float,
+        peak: int,
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{name}.prof"
+        profile.dump_stats(path)
+        snapshot.dump(str(path.with_suffix(".tracemalloc")))
+
+        summary = "\n".join(
+            [
+                f"Profile of phase {name}: {duration:.2f} s, peak traced memory "
+                f"{peak / 1e6:.2f} MB, see {path}",
+                *self.top_functions(profile),
+                *self.top_allocations(snapshot),
+            ]
+        )
+        path.with_suffix(".txt").write_text(summary + "\n")
+        print(summary)
+
+    def top_functions(self, profile: cProfile.Profile) -> List[str]:
+        stats = pstats.Stats(profile).stats
+        # stats: function -> (primitive calls, calls, own time, cumulative time, ...)
+        functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        return ["  cumulative (s)  own (s)     calls  function"] + [
+            f"  {ct:14.3f} {tt:8.3f} {nc:9d}  {pstats.func_std_string(function)}"
+            for function, (_, nc, tt, ct, _) in functions[: self.top]
+        ]
+
+    def top_allocations(self, snapshot: tracemalloc.Snapshot) -> List[str]:
+        return ["  allocated (MB)    blocks  allocation site"] + [
+            f"  {stat.size / 1e6:14.3f} {stat.count:9d}  "
+            f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+            for stat in snapshot.statistics("lineno")[: self.top]
+        ]
@@ -0,0 +1,225 @@
+import json
+import sys
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from time import monotonic
+from typing import Dict, Optional
+
+PROGRESS_LOG_FILENAME = "progress_events.jsonl"
+THROUGHPUT_WINDOW = 300  # seconds of progress used for the throughput and ETA
+RENDER_INTERVAL = 1  # seconds between redraws of the terminal view
+LOG_INTERVAL = 10  # seconds between progress records in the log
+BAR_LENGTH = 30
+
+# Phases shown in the progress view
+PREPARATION = "preparation"
+SUBMISSION = "submission"
+DOWNLOAD = "download"
+
+# States of the simulations in the log, next to the journal phases created,
+# queued and finished
+RUNNING = "running"
+CRASHED = "crashed"
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+class ProgressTracker:
+    """
+    Progress of the phases of a run and state transitions of its simulations.
+
+    Every state transition and, at most every LOG_INTERVAL seconds, the progress
+    of the running phases with their throughput and ETA over the last
+    THROUGHPUT_WINDOW seconds are appended as JSON lines to the log. When stdout
+    is a terminal the running phases are shown on a single line, redrawn at most
+    every RENDER_INTERVAL seconds. Otherwise only a line per finished phase is
+    printed.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.log = None
+        self.phases = {}
+        self.states = {}  # simulation -> last logged state
+        self.rendered = 0.0
+        self.logged = 0.0
+        self.line_length = 0
+
+    @contextmanager
+    def logging(self, path: Path):
+        """Append the progress log to path within the context."""
+        with Path(path).open("a", buffering=1) as log:
+            with self.lock:
+                self.log = log
+            try:
+                yield self
+            finally:
+                with self.lock:
+                    self.log = None
+
+    def write(self, record: Dict) -> None:
+        if self.log is not None:
+            record = {
+                "time": datetime.now().isoformat(timespec="milliseconds"),
+                **record,
+            }
+            self.log.write(json.dumps(record, default=str) + "\n")
+
+    def state(
+        self,
+        state: str,
+        simulation_id: Optional[int] = None,
+        name: Optional[str] = None,
+        **data,
+    ) -> None:
+        """Log the state of a simulation (or rain event name), if it changed."""
+        key = simulation_id if simulation_id is not None else name
+        with self.lock:
+            if self.states.get(key) == state:
+                return
+            self.states[key] = state
+            self.write(
+                {
+                    "type": "state",
+                    "state": state,
+                    "simulation_id": simulation_id,
+                    "name": name,
+                    **data,
+                }
+            )
+
+    def start(self, phase: str, total: int, text: str) -> None:
+        """Start phase, done when total is reached, shown as text."""
+        with self.lock:
+            now = monotonic()
+            self.phases[phase] = {
+                "text": text,
+                "total": total,
+                "done": 0,
+                "start": now,
+                "samples": deque([(now, 0)]),
+                "note": None,
+                "data": {},
+            }
+            self.write({"type": "phase_started", "phase": phase, "total": total})
+            self.render(force=True)
+
+    def update(
+        self, phase: str, done: float, note: Optional[str] = None, **data
+    ) -> None:
+        """
+        Set the number of done items of phase. The optional note is shown in the
+        terminal view and data is added to the progress records in the log, e.g.
+        the download speed.
+        """
+        with self.lock:
+            progress = self.phases.get(phase)
+            if progress is None:
+                return
+            if note is not None:
+                progress["note"] = note
+            progress["data"].update(data)
+            now = monotonic()
+            if progress["done"] != done:
+                progress["done"] = done
+                samples = progress["samples"]
+                samples.append((now, done))
+                while len(samples) > 2 and samples[1][0] < now - THROUGHPUT_WINDOW:
+                    samples.popleft()
+
+            if now - self.logged >= LOG_INTERVAL:
+                self.logged = now
+                for name in self.phases:
+                    self.write({"type": "progress", **self.summary(name)})
+            self.render()
+
+    @contextmanager
+    def phase(self, phase: str, total: int, text: str):
+        """Start phase within the context and finish it when leaving."""
+        self.start(phase, total, text)
+        try:
+            yield self
+        finally:
+            self.finish(phase)
+
+    def advance(self, phase: str, n: float = 1) -> None:
+        with self.lock:
+            self.update(phase, self.phases[phase]["done"] + n)
+
+    def finish(self, phase: str) -> None:
+        with self.lock:
+            summary = self.summary(phase)
+            text = self.phases.pop(phase)["text"]
+            self.write({"type": "phase_finished", **summary})
+            line = (
+                f"{text}: {summary['done']:g}/{summary['total']} in "
+                f"{format_duration(summary['duration'])}"
+            )
+            if sys.stdout.isatty():
+                # replace the terminal view by the line, then draw the rest
+                print("\r" + line.ljust(self.line_length))
+                self.line_length = 0
+                self.render(force=True)
+            else:
+                print(line)
+
+    def summary(self, phase: str) -> Dict:
+        """The progress of phase, its throughput per second and ETA in seconds."""
+        progress = self.phases[phase]
+        start, start_done = progress["samples"][0]
+        now, done = monotonic(), progress["done"]
+        throughput = (done - start_done) / (now - start) if now > start else None
+        eta = None
+        if throughput:
+            eta = max(progress["total"] - done, 0) / throughput
+        return {
+            "phase": phase,
+            "done": done,
+            "total": progress["total"],
+            "duration": now - progress["start"],
+            "throughput": throughput,
+            "eta": eta,
+            **progress["data"],
+        }
+
+    def render(self, force: bool = False) -> None:
+        """Redraw the terminal view, at most every RENDER_INTERVAL seconds."""
+        now = monotonic()
+        if not sys.stdout.isatty() or not (
+            force or now - self.rendered >= RENDER_INTERVAL
+        ):
+            return
+        self.rendered = now
+        views = []
+        for phase, progress in self.phases.items():
+            summary = self.summary(phase)
+            fraction = min(summary["done"] / max(summary["total"], 1), 1)
+            bar = "#" * int(BAR_LENGTH * fraction)
+            view = (
+                f"{progress['text']} |{bar.ljust(BAR_LENGTH, '-')}| "
+                f"{summary['done']:g}/{summary['total']} "
+                f"{summary['throughput'] or 0:.2f}/s "
+                f"ETA {format_duration(summary['eta'])}"
+            )
+            if progress["note"]:
+                view += f" ({progress['note']})"
+            views.append(view)
+        line = " | ".join(views)
+        print("\r" + line.ljust(self.line_length), end="", flush=True)
+        self.line_length = len(line)
+
+
+# Shared by the whole run
+run_progress = ProgressTracker()
@@ -0,0 +1,113 @@
+import hashlib
+import numpy as np
+import os
+import pandas
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+
+def read_rain_file(path: Path) -> Dict:
+    """
+    Parse a rain file in 'min,mm'-format and validate its contents.
+    Intensities are converted from [mm/timestep in minutes] to [m/s].
+    The sha256 of the file contents identifies identical rain events.
+    """
+    event = {
+        "file": path,
+        "name": path.name.split(".")[0],
+        "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+        "errors": [],
+        "warnings": [],
+    }
+    try:
+        timeseries = np.loadtxt(path, delimiter=",", dtype=np.float64, ndmin=2)
+    except ValueError as e:
+        event["errors"].append(f"{path.name}: could not be parsed ({e})")
+        return event
+
+    if timeseries.shape[0] < 2 or timeseries.shape[1] != 2:
+        event["errors"].append(
+            f"{path.name}: should contain at least 2 rows of 'min,mm' values"
+        )
+        return event
+
+    minutes, values = timeseries[:, 0], timeseries[:, 1]
+    timesteps = np.diff(minutes)
+    if minutes[0] != 0:
+        event["errors"].append(f"{path.name}: first timestamp should be 0")
+    if np.any(timesteps <= 0):
+        event["errors"].append(f"{path.name}: timestamps should be increasing")
+    if np.any(values < 0):
+        event["errors"].append(f"{path.name}: rain values should not be negative")
+    if values[-1] != 0:
+        event["warnings"].append(
+            f"Warning: {path.name} last rain intensity value is not 0"
+        )
+
+    # The last value is converted using the length of the last timestep
+    timesteps = np.append(timesteps, timesteps[-1])
+    event["time"] = minutes * 60
+    event["duration"] = int(minutes[-1] * 60)
+    event["intensities"] = values / (timesteps * 1000) / 60
+    return event
+
+
+def parse_start_dates(files: List[Path]) -> np.ndarray:
+    """
+    Parse the start dates from the last part of the filenames (%Y%m%d%H%M%S).
+    The dates are NL datetimes, these are converted to timezone unaware UTC.
+    Unparsable dates are returned as NaT.
+    """
+    local = pandas.to_datetime(
+        [f.name.split()[-1] for f in files], format="%Y%m%d%H%M%S", errors="coerce"
+    )
+    utc = (
+        local.tz_localize(
+            "Europe/Amsterdam",
+            # Ambiguous (DST to winter time) and nonexistent (winter time to DST)
+            # local times are treated as summer time.
+            ambiguous=np.ones(len(local), dtype=bool),
+            nonexistent=pandas.Timedelta(hours=1),
+        )
+        .tz_convert("UTC")
+        .tz_localize(None)
+    )
+    return utc.to_pydatetime()
+
+
+def load_rain_events(rain_files_dir: Path, workers: Optional[int] = None) -> List[Dict]:
+    """
+    Read and validate all rain files in rain_files_dir using a pool of worker
+    processes. Returns one event per file (sorted by filename) with its name,
+    start_date, duration [s], time [s], intensities [m/s] and warnings.
+
+    Raises a ValueError listing all invalid files.
+    """
+    files = sorted(f for f in rain_files_dir.iterdir() if f.is_file())
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) < 2:
+        events = [read_rain_file(f) for f in files]
+    else:
+        chunksize = max(1, len(files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            events = list(executor.map(read_rain_file, files, chunksize=chunksize))
+
+    errors = []
+    for event, start_date in zip(events, parse_start_dates(files)):
+        if pandas.isnull(start_date):
+            errors.append(f"{event['file'].name}: filename does not end with a date")
+        event["start_date"] = start_date
+        errors.extend(event.pop("errors"))
+
+    if len(files) == 0:
+        errors.append(f"{rain_files_dir}: no rain files found")
+    if len(errors) > 0:
+        raise ValueError("Invalid rain files:\n" + "\n".join(errors))
+
+    return events
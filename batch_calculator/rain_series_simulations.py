@@ -1,21 +1,70 @@
-from urllib.request import urlretrieve
-from venv import create
 import click
 import numpy as np
 import json
-import os
+import random
 import shutil
-import pytz
+import os
 import netCDF4 as nc4
+import struct
 import zipfile
 
 
-from datetime import datetime
+from batch_calculator.artifacts import (
+    ArtifactCache,
+    artifact_key,
+    DEFAULT_ARTIFACT_CACHE_DIR,
+    DEFAULT_ARTIFACT_CACHE_SIZE,
+    link_artifact,
+)
+from batch_calculator.downloads import download_file
+from batch_calculator.dwf_registry import DWF_REGISTRY_FILENAME, DWFRegistry
+from batch_calculator.journal import (
+    CREATED,
+    DWF,
+    FINISHED,
+    Journal,
+    open_journal,
+    QUEUED,
+    RAIN_UPLOADED,
+    SAVED_STATE_SET,
+    SAVED_STATES_CREATED,
+)
+from batch_calculator.metrics import run_metrics
+from batch_calculator.polling import PollScheduler
+from batch_calculator.profiling import PhaseProfiler, PROFILE_DIRNAME
+from batch_calculator.progress import (
+    CRASHED,
+    FAILED,
+    PREPARATION,
+    PROGRESS_LOG_FILENAME,
+    run_progress,
+    RUNNING,
+    SUBMISSION,
+)
+from batch_calculator.rain_events import load_rain_events
+from batch_calculator.rate_limit import TokenBucket
+from batch_calculator.simulation_index import (
+    memo_key,
+    SIMULATION_INDEX_FILENAME,
+    SimulationIndex,
+)
+from concurrent.futures import (
+    as_completed,
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+from io import BytesIO
 from pathlib import Path
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 from threedi_api_client import ThreediApi
-from threedi_api_client.files import upload_file
+from threedi_api_client.files import upload_fileobj
 from threedi_api_client.openapi.exceptions import ApiException
 from threedi_api_client.openapi.models import (
     Action,
@@ -30,70 +79,180 @@ from threedi_api_client.openapi.models import (
     UploadEventFile,
 )
 from threedi_api_client.versions import V3BetaApi
-from time import sleep
+from time import monotonic, sleep
 from typing import (
+    Callable,
     Dict,
     List,
+    Optional,
+    Tuple,
 )
+from urllib3.exceptions import ConnectTimeoutError, HTTPError
 
 RAIN_EVENTS_START_DATE = datetime(1955, 1, 1)
 REQUIRED_AGGREGATION_METHODS = {"cum", "cum_negative", "cum_positive"}
-API_429_TIMEOUT = 60
+API_MAX_REQUESTS_PER_SECOND = 10
+API_MAX_ATTEMPTS = 8
+API_BACKOFF = 1  # seconds, doubled for every retry
+API_MAX_BACKOFF = 60  # seconds, the Retry-After of the API is not capped
+API_RETRY_STATUSES = {429, 502, 503, 504}
+# Statuses at which a POST is known not to be processed, so it is safe to retry
+API_POST_RETRY_STATUSES = {429, 503}
+# Suffixes of the API methods that are GET requests, see idempotent
+API_GET_SUFFIXES = ("_list", "_read", "_download")
 TIMEOUT = 5
+RAIN_CHUNK_SIZE = 300
+RAIN_NETCDF_CHUNK_SIZE = 4096
+RAIN_NETCDF_SIZE = 64 * 1024  # initial size of the in-memory netcdfs
 
+# Shared by all API calls, see api_call
+api_rate_limit = TokenBucket(API_MAX_REQUESTS_PER_SECOND)
+
+
+def retry_delay(attempt: int, exception: Exception) -> float:
+    """
+    Seconds to wait before retrying: the Retry-After header of the response in
+    full if present, else exponential backoff with full jitter of at most
+    API_MAX_BACKOFF seconds.
+    """
+    headers = getattr(exception, "headers", None) or {}
+    retry_after = headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            try:
+                retry_date = parsedate_to_datetime(retry_after)
+                delay = (
+                    retry_date - datetime.now(tz=retry_date.tzinfo)
+                ).total_seconds()
+                return max(delay, 0)
+            except (TypeError, ValueError):
+                pass
+
+    return random.uniform(0, min(API_BACKOFF * 2**attempt, API_MAX_BACKOFF))
 
-def api_call(call, *args, **kwargs):
-    try:
-        result = call(*args, **kwargs)
-    except ApiException as e:
-        if e.status == 429:
-            sleep(API_429_TIMEOUT)
-            return api_call(call, *args, **kwargs)
-        else:
-            raise e
 
-    return result
+def idempotent(endpoint: str) -> bool:
+    """Whether the API method endpoint is a GET request, by its name."""
+    return endpoint.endswith(API_GET_SUFFIXES)
 
 
-def printProgressBar(iteration, total, text, length=100):
-    percent = int(100 * (iteration / total))
-    bar = "#" * percent + "-" * (length - percent)
-    print(f"\r{text} |{bar}| {percent}% Completed", end="\r")
-    if iteration == total:
-        print()
+def connect_error(exception: HTTPError) -> bool:
+    """Whether the request failed before it was sent, e.g. connection refused."""
+    return isinstance(getattr(exception, "reason", exception), ConnectTimeoutError)
 
 
-def download_sqlite(api: V3BetaApi, threedimodel_id: int, results_dir: Path) -> Path:
+def api_call(call, *args, **kwargs):
+    """
+    Call an API method through the shared rate limit. Throttled requests (429),
+    gateway errors (502, 503, 504) and connection errors are retried up to
+    API_MAX_ATTEMPTS times. Requests that are not idempotent (POST) may have been
+    processed after a 502, 504 or read timeout, so they are only retried when
+    throttled (429), unavailable (503) or the connection failed.
+    """
+    endpoint = getattr(call, "__name__", repr(call))
+    retry_statuses = (
+        API_RETRY_STATUSES if idempotent(endpoint) else API_POST_RETRY_STATUSES
+    )
+    for attempt in range(API_MAX_ATTEMPTS):
+        api_rate_limit.acquire()
+        start = monotonic()
+        try:
+            result = call(*args, **kwargs)
+            run_metrics.request(endpoint, monotonic() - start, "ok")
+            return result
+        except ApiException as e:
+            run_metrics.request(endpoint, monotonic() - start, str(e.status))
+            if e.status not in retry_statuses or attempt + 1 == API_MAX_ATTEMPTS:
+                raise e
+            delay = retry_delay(attempt, e)
+            if e.status == 429:
+                # slow down all callers, not just this one
+                api_rate_limit.count("throttled")
+                run_metrics.count(endpoint, "throttled")
+                api_rate_limit.pause(delay)
+        except HTTPError as e:
+            run_metrics.request(endpoint, monotonic() - start, "error")
+            if attempt + 1 == API_MAX_ATTEMPTS or not (
+                idempotent(endpoint) or connect_error(e)
+            ):
+                raise e
+            delay = retry_delay(attempt, e)
+
+        api_rate_limit.count("retries")
+        run_metrics.count(endpoint, "retries")
+        sleep(delay)
+
+
+def download_sqlite(
+    api: V3BetaApi,
+    threedimodel_id: int,
+    results_dir: Path,
+    artifact_cache: Optional[ArtifactCache] = None,
+) -> Path:
+    """
+    Download the sqlite of the threedimodel revision to results_dir, extracting it
+    when it is zipped. With an artifact_cache the download and extracted sqlite are
+    only fetched once per model revision and linked into results_dir.
+    """
     print("Downloading and validating sqlite...")
-    threedimodel: ThreediModel = api.threedimodels_read(threedimodel_id)
-    revision: Revision = api.schematisations_revisions_read(
+    threedimodel: ThreediModel = api_call(api.threedimodels_read, threedimodel_id)
+    revision: Revision = api_call(
+        api.schematisations_revisions_read,
         threedimodel.revision_id,
         schematisation_pk=threedimodel.schematisation_id,
     )
     if revision.sqlite is None or revision.sqlite.file.state != "uploaded":
         raise ValueError("The revision has no SQLite.")
 
-    download = api.schematisations_revisions_sqlite_download(
-        threedimodel.revision_id,
-        schematisation_pk=threedimodel.schematisation_id,
-    )
-    path = results_dir / revision.sqlite.file.filename
-    urlretrieve(download.get_url, path)
-
-    if path.suffix.lower() == ".zip":
-        # Extract sqlite from zip
-        with path.open("rb") as f:
-            zf = zipfile.ZipFile(f)
-            for fn in zf.namelist():
-                if fn.lower().endswith(".sqlite"):
-                    zf.extract(fn, path=path.parent)
-                    return path.parent / fn
-            else:
-                raise FileNotFoundError(
-                    f"Could not find an .sqlite in zipfile {path}"
-                )
-            
-    return path
+    def download(directory: Path) -> Path:
+        sqlite_download = api_call(
+            api.schematisations_revisions_sqlite_download,
+            threedimodel.revision_id,
+            schematisation_pk=threedimodel.schematisation_id,
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / revision.sqlite.file.filename
+        download_file(
+            sqlite_download.get_url,
+            path,
+            revision.sqlite.file.size,
+            revision.sqlite.file.etag,
+        )
+
+        if path.suffix.lower() == ".zip":
+            # Extract sqlite from zip
+            with path.open("rb") as f:
+                zf = zipfile.ZipFile(f)
+                for fn in zf.namelist():
+                    if fn.lower().endswith(".sqlite"):
+                        zf.extract(fn, path=path.parent)
+                        return path.parent / fn
+                else:
+                    raise FileNotFoundError(
+                        f"Could not find an .sqlite in zipfile {path}"
+                    )
+
+        return path
+
+    if artifact_cache is None:
+        return download(results_dir)
+
+    key = artifact_key(threedimodel_id, threedimodel.revision_id)
+    for attempt in range(2):
+        cached = artifact_cache.fetch(key, "sqlite", download)
+        sqlite_path = next(
+            (f for f in sorted(cached.rglob("*")) if f.suffix.lower() == ".sqlite"),
+            None,
+        )
+        if sqlite_path is not None:
+            link_artifact(cached, results_dir)
+            return results_dir / sqlite_path.relative_to(cached)
+        # a broken cache entry, e.g. emptied by hand, is downloaded once more
+        shutil.rmtree(cached)
+
+    raise FileNotFoundError(f"Could not find an .sqlite in {cached}")
 
 
 def validate_sqlite(sqlite_path: Path):
@@ -151,25 +310,88 @@ def create_simulation(
 
 
 def await_simulation_completion(api: V3BetaApi, simulation: Simulation) -> None:
-    while True:
-        status: SimulationStatus = api_call(api.simulations_status_list, simulation.id)
-        if status.name == "crashed":
-            raise ValueError("DWF initialization simulation crashed")
-        elif status.name != "finished":
-            try:
-                progress: Progress = api_call(
-                    api.simulations_progress_list, simulation.id
-                )
-                printProgressBar(
-                    progress.percentage, 100, f"Simulation {simulation.id}"
-                )
-            except ApiException as e:  # no progress while initializing
-                if "No progress" not in e.body:
-                    raise e
-            finally:
-                sleep(TIMEOUT)
-        else:
-            return
+    scheduler = PollScheduler([simulation.id])
+    with run_progress.phase(DWF, 100, f"Simulation {simulation.id}"):
+        for simulation_id in scheduler:
+            status: SimulationStatus = api_call(
+                api.simulations_status_list, simulation_id
+            )
+            if status.name == "crashed":
+                run_progress.state(CRASHED, simulation_id, DWF)
+                raise ValueError("DWF initialization simulation crashed")
+            elif status.name != "finished":
+                try:
+                    progress: Progress = api_call(
+                        api.simulations_progress_list, simulation_id
+                    )
+                    run_progress.state(RUNNING, simulation_id, DWF)
+                    run_progress.update(DWF, progress.percentage)
+                    scheduler.update(simulation_id, progress.percentage)
+                except ApiException as e:  # no progress while initializing
+                    if "No progress" not in e.body:
+                        raise e
+            else:
+                run_progress.state(FINISHED, simulation_id, DWF)
+                run_progress.update(DWF, 100)
+                scheduler.remove(simulation_id)
+
+
+def setup_dwf_simulation(
+    api: V3BetaApi,
+    threedimodel_id: int,
+    organisation: str,
+    journal: Optional[Journal] = None,
+) -> Tuple[Simulation, List[SavedStateOverview]]:
+    """
+    Create and run the 3 day DWF simulation and its saved states. Steps the
+    journal lists as done are skipped.
+    """
+    phases = journal.state(DWF)["phases"] if journal else {}
+    if CREATED in phases:
+        simulation_dwf = api_call(api.simulations_read, phases[CREATED]["id"])
+    else:
+        print("Creating 3 day DWF simulation")
+        simulation_dwf: Simulation = create_simulation(
+            api,
+            threedimodel_id,
+            organisation,
+            3 * 24 * 60 * 60,
+            RAIN_EVENTS_START_DATE.strftime("%Y-%m-%dT%H:%M:%S"),
+        )
+        run_progress.state(CREATED, simulation_dwf.id, DWF)
+        if journal:
+            journal.record(DWF, CREATED, simulation_dwf.id, simulation_dwf.to_dict())
+
+    if SAVED_STATES_CREATED in phases:
+        saved_states = get_saved_states(api, simulation_dwf)
+    else:
+        saved_states = create_saved_states(api, simulation_dwf)
+        if journal:
+            journal.record(
+                DWF,
+                SAVED_STATES_CREATED,
+                simulation_dwf.id,
+                [ss.to_dict() for ss in saved_states],
+            )
+
+    if QUEUED not in phases:
+        api_call(
+            api.simulations_actions_create,
+            *(
+                simulation_dwf.id,
+                Action(name="queue"),
+            ),
+        )
+        run_progress.state(QUEUED, simulation_dwf.id, DWF)
+        if journal:
+            journal.record(DWF, QUEUED, simulation_dwf.id)
+
+    if FINISHED not in phases:
+        await_simulation_completion(api, simulation_dwf)
+        if journal:
+            journal.record(DWF, FINISHED, simulation_dwf.id)
+
+    return simulation_dwf, saved_states
 
 
 def create_saved_states(
@@ -192,317 +414,365 @@ def create_saved_states(
 def get_saved_states(
     api: V3BetaApi, simulation: Simulation
 ) -> List[SavedStateOverview]:
-    results = []
-    states = api_call(
-        api.simulations_create_saved_states_timed_list, simulation.id, **{"limit": 100}
-    )
-    for i in range(24):
-        for state in states.results:
-            if state.name == f"DWF hour {i}":
-                results.append(state)
-                break
+    """Return the 'DWF hour {i}' saved states of simulation, ordered by hour."""
+    states = {}
+    offset = 0
+    while True:
+        page = api_call(
+            api.simulations_create_saved_states_timed_list,
+            simulation.id,
+            **{"limit": 100, "offset": offset},
+        )
+        for state in page.results:
+            states.setdefault(state.name, state)
+        if page.next is None:
+            break
+        offset += 100
 
-    return results
+    return [states[f"DWF hour {i}"] for i in range(24) if f"DWF hour {i}" in states]
 
 
-def convert_to_netcdf(rain_files_dir: Path) -> List[Dict]:
-    """Read timeseries data, convert to m/s, and write to netcdf file."""
+def reuse_dwf_simulation(
+    api: V3BetaApi,
+    registry: DWFRegistry,
+    threedimodel_id: int,
+    revision_id: int,
+    organisation: str,
+    journal: Optional[Journal] = None,
+) -> Optional[Tuple[Simulation, List[SavedStateOverview]]]:
+    """
+    Look up the DWF simulation of the model revision in the registry and check that
+    it finished and all 24 saved states are available and not expired. Returns
+    None (and forgets the simulation) when it cannot be reused.
+    """
+    simulation_id = registry.get(threedimodel_id, revision_id, organisation)
+    if simulation_id is None:
+        print("No DWF simulation registered for this model revision")
+        return None
 
-    # Make sure netcdf results folder exists and is empty
     try:
-        os.mkdir("netcdf_rain_files")
-    except FileExistsError:
-        shutil.rmtree("netcdf_rain_files")
-        os.mkdir("netcdf_rain_files")
-
-    result = []
-    filenames = [f for f in rain_files_dir.iterdir() if f.is_file()]
-    for filename in filenames:
-        # retrievie rain timeseries data
-        with open(filename, "r") as f:
-            timeseries = np.array(
-                [
-                    [int(row.split(",")[0]), float(row.split(",")[1])]
-                    for row in f.read().split("\n")
-                    if row
-                ]
-            )
+        simulation_dwf = api_call(api.simulations_read, simulation_id)
+        status: SimulationStatus = api_call(api.simulations_status_list, simulation_id)
+        saved_states = get_saved_states(api, simulation_dwf)
+    except ApiException as e:
+        if e.status != 404:
+            raise e
+        simulation_dwf, status, saved_states = None, None, []
 
-        if timeseries[0, 0] != 0:
-            raise ValueError(f"{filename}: first timestamp should be 0")
-        if timeseries[-1, 1] != 0:
-            print(f"Warning: {filename.name} last rain intensity value is not 0")
-
-        # parse datetime from filename (NL datetime to UTC to timezone unaware)
-        filename_date = (
-            datetime.strptime(filename.name.split()[-1], "%Y%m%d%H%M%S")
-            .astimezone(tz=pytz.timezone("Europe/Amsterdam"))
-            .astimezone(tz=pytz.UTC)
-            .replace(tzinfo=None)
+    now = datetime.now(timezone.utc)
+    expired = [
+        ss.name
+        for ss in saved_states
+        if ss.expiry is not None and ss.expiry.astimezone(timezone.utc) <= now
+    ]
+    if (
+        status is None
+        or status.name != "finished"
+        or len(saved_states) != 24
+        or len(expired) > 0
+    ):
+        print(f"DWF simulation {simulation_id} cannot be reused")
+        registry.remove(threedimodel_id, revision_id, organisation)
+        return None
+
+    print(f"Reusing DWF simulation {simulation_id}")
+    if journal:
+        journal.record(DWF, CREATED, simulation_dwf.id, simulation_dwf.to_dict())
+        journal.record(
+            DWF,
+            SAVED_STATES_CREATED,
+            simulation_dwf.id,
+            [ss.to_dict() for ss in saved_states],
         )
+        journal.record(DWF, QUEUED, simulation_dwf.id)
+        journal.record(DWF, FINISHED, simulation_dwf.id)
+    return simulation_dwf, saved_states
 
-        rain_event_start_date = RAIN_EVENTS_START_DATE + (
-            filename_date - RAIN_EVENTS_START_DATE
-        )
-        rain_event_start_seconds = (
-            rain_event_start_date - RAIN_EVENTS_START_DATE
-        ).total_seconds()
-
-        # Convert from [mm/timestep in minutes] to [mm/h]
-        timesteps = np.diff(timeseries[:, 0])
-        values_converted = timeseries[:-1, 1] / (timesteps / 60)
-        values_converted = np.append(
-            values_converted, timeseries[-1, 1] / (timesteps[-1] / 60)
-        )
-        time = timeseries[:, 0] * 60 + rain_event_start_seconds
 
-        path = Path("netcdf_rain_files") / (filename.name + ".nc")
-        result.append(
-            {
-                "file": path,
-                "duration": timeseries[-1, 0] * 60,
-                "start_date": rain_event_start_date,
-            }
-        )
+def hdf5_image_size(image: bytes) -> int:
+    """
+    Return the size of the HDF5 file image from the end of file address in its
+    superblock. The in-memory netcdfs of netCDF4 are padded beyond this size.
+    """
+    if image[8] < 2 and image[13] == 8:  # superblock version 0 or 1
+        eof_offset = 40 if image[8] == 0 else 44
+    elif image[8] >= 2 and image[9] == 8:
+        eof_offset = 28
+    else:
+        return len(image)
+    return min(struct.unpack("<Q", image[eof_offset : eof_offset + 8])[0], len(image))
 
-        # # Create netcdf
-        # netcdf = h5py.File(
-        #     path,
-        #     mode="w",
-        # )
-
-        # # Global attributes
-        # netcdf.attrs["title"] = bytes(filename.name, encoding="utf-8")
-        # netcdf.attrs["institution"] = b"Nelen & Schuurmans"
-        # netcdf.attrs["SIMULATION_OFFSET"] = 0
-        # netcdf.attrs["SIMULATION_START_TIMESTEP"] = 0
-
-        # # Datasets
-
-        # netcdf.create_dataset(
-        #     "SIMULATION_START_TIMESTEP",
-        #     data=np.array([0]),
-        #     dtype=np.int32,
-        # )
-        # # one = netcdf.create_dataset("one", np.array([0.0], dtype=np.float64), dtype=np.float64)
-        # time = netcdf.create_dataset("time", data=time, dtype=np.float64)
-        # values = netcdf.create_dataset(
-        #     "values", data=values_converted, dtype=np.float64
-        # )
-
-        # # Dataset attributes
-        # # one.attrs["_Netcdf4Dimid"] = 1
-        # time.attrs["_Netcdf4Dimid"] = 0
-        # time.attrs["axis"] = b"T"
-        # time.attrs["calendar"] = b"standard"
-        # time.attrs["long_name"] = b"Time"
-        # time.attrs["standard_name"] = b"time"
-        # time.attrs["units"] = b"seconds since 1955-01-01 00:00:00.0 +0000'"
-        # values.attrs["_FillValue"] = np.array([-9999], dtype=np.int32)
-        # values.attrs["units"] = b"mm/h"
-
-        # # Set time as coordinate for values
-        # # one.make_scale("one")
-        # time.make_scale("time")
-        # values.dims[0].attach_scale(time)
-        # # values.dims[0].attach_scale(one)
-        # netcdf.close()
-
-        f = nc4.Dataset(path, "w")
-        f.CDI = "Climate Data Interface version ?? (httpf.//mpimet.mpg.de/cdi)"
-        f.Conventions = "CF-1.5"
-        f.GDAL_AREA_OR_POINT = "Area"
-        f.GDAL = "GDAL 2.2.3, released 2017/11/20"
-        f.NCO = "4.7.2"
-        f.CDO = "Climate Data Operators version 1.9.3 (http://mpimet.mpg.de/cdo)"
-        # f.OFFSET = 0
-        # f.SIMULATION_OFFSET = 0
-        # f.SIMULATION_START_TIMESTEP = 0
-
-        f.createDimension("time", None)  # infinite size
-        f.createDimension("one", 1)
-
-        time_var = f.createVariable("time", np.float64, ("time",))
-        time_var.standard_name = "time"
-        time_var.long_name = "Time"
-        time_var.units = "seconds since 1955-01-01 00:00:00.0 +0000"
-        time_var.calendar = "standard"
-        time_var.axis = "T"
-
-        sim_start_var = f.createVariable("SIMULATION_START_TIMESTEP", np.int64, ())
-
-        values_var = f.createVariable(
-            "values", np.float64, ("time", "one"), fill_value=-9999
-        )
-        values_var.units = "mm/h"
 
-        time_var[:] = time
-        values_var[:] = values_converted * 10e3
-        sim_start_var[:] = np.array([0])
+def write_rain_netcdf(rain_event: Dict) -> bytes:
+    """
+    Write the rain event intensities in [mm/h] to an in-memory (compressed) netcdf
+    rain file, with the time in seconds since RAIN_EVENTS_START_DATE.
+    """
+    rain_event_start_seconds = (
+        rain_event["start_date"] - RAIN_EVENTS_START_DATE
+    ).total_seconds()
+
+    # Convert from [m/s] to [mm/h]
+    values_converted = rain_event["intensities"] * 1000 * 3600
+    time = rain_event["time"] + rain_event_start_seconds
+    chunksize = min(len(time), RAIN_NETCDF_CHUNK_SIZE)
+
+    f = nc4.Dataset(rain_event["file"].name + ".nc", "w", memory=RAIN_NETCDF_SIZE)
+    f.Conventions = "CF-1.5"
+
+    f.createDimension("time", None)  # infinite size
+    f.createDimension("one", 1)
 
-        f.close()
+    time_var = f.createVariable(
+        "time", np.float64, ("time",), zlib=True, chunksizes=(chunksize,)
+    )
+    time_var.standard_name = "time"
+    time_var.long_name = "Time"
+    time_var.units = "seconds since 1955-01-01 00:00:00.0 +0000"
+    time_var.calendar = "standard"
+    time_var.axis = "T"
+
+    sim_start_var = f.createVariable("SIMULATION_START_TIMESTEP", np.int64, ())
+
+    values_var = f.createVariable(
+        "values",
+        np.float64,
+        ("time", "one"),
+        fill_value=-9999,
+        zlib=True,
+        chunksizes=(chunksize, 1),
+    )
+    values_var.units = "mm/h"
 
-    return result
+    time_var[:] = time
+    values_var[:] = values_converted
+    sim_start_var[:] = np.array([0])
+
+    image = f.close()
+    return image[: hdf5_image_size(image)].tobytes()
+
+
+def convert_to_netcdf(
+    rain_events: List[Dict], workers: Optional[int] = None
+) -> List[bytes]:
+    """
+    Convert rain event intensities to mm/h and write them to in-memory netcdf files,
+    using a pool of worker processes.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(rain_events) < 2:
+        return [write_rain_netcdf(event) for event in rain_events]
+
+    chunksize = max(1, len(rain_events) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(write_rain_netcdf, rain_events, chunksize=chunksize))
+
+
+def upload_rain_netcdf(
+    api: V3BetaApi, simulation: Simulation, filename: str, netcdf: bytes
+) -> None:
+    """Upload an in-memory netcdf rain file as file timeseries rain."""
+    upload: UploadEventFile = api_call(
+        api.simulations_events_rain_timeseries_netcdf_create,
+        simulation.id,
+        **{"data": {"filename": filename}},
+    )
+    upload_fileobj(upload.put_url, BytesIO(netcdf))
+    run_metrics.transferred("uploaded", len(netcdf))
 
 
 def create_simulations_from_netcdf_rain_events(
     api: V3BetaApi,
-    saved_states: List,
-    netcdfs: List[Dict],
+    saved_states: Optional[List],
     threedimodel_id: int,
     organisation_id: str,
+    rain_events: List[Dict],
+    submit_workers: int = 1,
+    journal: Optional[Journal] = None,
+    dwf: Optional[Future] = None,
+    netcdf_workers: Optional[int] = None,
 ) -> List[Simulation]:
     """
-    Read start time from netcf filename and create simulations with the corresponding
-    initial state from the DWF runs. Create file timeseries rain from netcdf data.
-    Save created simulations to JSON as fallback.
-    """
-    rain_event_simulations = []
-    for i, netcdf in enumerate(netcdfs):
-        printProgressBar(i + 1, len(netcdfs), "Creating rain event simulations")
-        filepath = netcdf["file"]
-        start_date = netcdf["start_date"]
-
-        # create simulation and set initial state
-        simulation = create_simulation(
-            api,
-            threedimodel_id,
-            organisation_id,
-            netcdf["duration"],
-            start_date,
-            f"rain series calculation {filepath.name.split('.')[0]}",
-        )
-        api_call(
-            api.simulations_initial_saved_state_create,
-            simulation.id,
-            **{"data": {"saved_state": saved_states[start_date.hour].id}},
-        )
-
-        upload: UploadEventFile = api_call(
-            api.simulations_events_rain_timeseries_netcdf_create,
-            simulation.id,
-            **{"data": {"filename": filepath.name}},
-        )
-        upload_file(upload.put_url, filepath)
+    Create simulations for the rain events with the initial state from the DWF runs
+    corresponding to their start time. Create file timeseries rain from netcdf data.
 
-        rain_event_simulations.append(simulation)
+    The netcdfs are written by netcdf_workers processes and up to submit_workers
+    simulations are created and uploaded concurrently. Every simulation is queued
+    as soon as its netcdf is processed (and the saved states of dwf, the future of
+    a running setup_dwf_simulation, are available).
+    """
+    print("Writing netcdf rain files...")
+    netcdfs = convert_to_netcdf(rain_events, netcdf_workers)
+
+    results = [None] * len(rain_events)
+    failures = []
+    simulations = {}  # simulation id -> event index, simulation
+    processed = []  # (event index, simulation) with a processed netcdf
+    scheduler = PollScheduler()
+    with run_progress.phase(
+        SUBMISSION, len(rain_events), "Creating rain event simulations"
+    ), ThreadPoolExecutor(max_workers=submit_workers) as executor:
+        in_flight = {
+            executor.submit(
+                prepare_rain_event_simulation,
+                api,
+                threedimodel_id,
+                organisation_id,
+                rain_event,
+                journal,
+                partial(
+                    upload_rain_netcdf,
+                    api,
+                    filename=rain_event["file"].name + ".nc",
+                    netcdf=netcdf,
+                ),
+            ): i
+            for i, (rain_event, netcdf) in enumerate(zip(rain_events, netcdfs))
+        }
+        started = set()  # futures of start_rain_event_simulation
+
+        def collect(timeout):
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = in_flight.pop(future)
+                name = rain_events[i]["name"]
+                try:
+                    simulation = future.result()
+                except Exception as e:
+                    run_progress.state(FAILED, name=name)
+                    failures.append(
+                        f"Error: {rain_events[i]['file'].name} could not be "
+                        f"submitted: {e}"
+                    )
+                    continue
+                if future in started or (
+                    journal and QUEUED in journal.state(name)["phases"]
+                ):
+                    results[i] = simulation
+                else:
+                    simulations[simulation.id] = (i, simulation)
+                    scheduler.add(simulation.id)
+
+        while len(in_flight) > 0 or len(scheduler) > 0 or len(processed) > 0:
+            run_progress.update(
+                SUBMISSION, len([r for r in results if r is not None]) + len(failures)
+            )
+            if saved_states is None and (
+                dwf.done() or (len(in_flight) == 0 and len(scheduler) == 0)
+            ):
+                print("Waiting for the DWF simulation to finish...")
+                _, saved_states = dwf.result()
+            if saved_states is not None:
+                for i, simulation in processed:
+                    future = executor.submit(
+                        start_rain_event_simulation,
+                        api,
+                        simulation,
+                        saved_states,
+                        rain_events[i],
+                        journal,
+                    )
+                    started.add(future)
+                    in_flight[future] = i
+                processed = []
+
+            if len(in_flight) > 0:
+                collect(timeout=min(max(scheduler.due_in(), 0), TIMEOUT))
+            simulation_id = scheduler.poll(timeout=0 if len(in_flight) > 0 else None)
+            if simulation_id is None:
+                continue
 
-    # Start simulation if netcdf is processed
-    print("Starting rain event simulations...")
-    started_simulations = []
-    while len(rain_event_simulations) > 0:
-        for simulation in rain_event_simulations:
             netcdf = api_call(
-                api.simulations_events_rain_timeseries_netcdf_list, simulation.id
+                api.simulations_events_rain_timeseries_netcdf_list, simulation_id
             ).results[0]
             if netcdf.file.state == "processed":
-                started_simulations.append(simulation)
-                rain_event_simulations.remove(simulation)
-                api_call(
-                    api.simulations_actions_create,
-                    *(
-                        simulation.id,
-                        Action(name="queue"),
-                    ),
-                )
+                scheduler.remove(simulation_id)
+                processed.append(simulations[simulation_id])
             elif netcdf.file.state == "error":
-                print(
-                    f"Warning: error processing netcdf for simulation {simulation.id}.",
-                    netcdf.file.state_description,
+                scheduler.remove(simulation_id)
+                i = simulations[simulation_id][0]
+                run_progress.state(FAILED, simulation_id, rain_events[i]["name"])
+                failures.append(
+                    f"Warning: error processing netcdf for simulation {simulation_id}. "
+                    f"{netcdf.file.state_description}"
                 )
-            sleep(TIMEOUT)
 
-    return started_simulations
+    for failure in failures:
+        print(failure)
 
+    return [result for result in results if result is not None]
 
-def create_simulations_from_rain_events(
+
+def prepare_rain_event_simulation(
     api: V3BetaApi,
-    saved_states: List,
     threedimodel_id: int,
     organisation_id: str,
-    rain_files_dir: Path,
-) -> List[Simulation]:
+    rain_event: Dict,
+    journal: Optional[Journal] = None,
+    upload: Optional[Callable[[Simulation], None]] = None,
+) -> Simulation:
     """
-    Read start time from rain files filename and create simulations with the corresponding
-    initial state from the DWF runs. Create timeseries rain event from file data.
-    Save created simulations to JSON as fallback.
+    Create the simulation for a single rain event and add its rain with upload,
+    by default upload_rain_timeseries. This does not depend on the saved states
+    of the DWF simulation.
+
+    Every step is recorded in the journal. Steps the journal lists as done for
+    this event are skipped. A simulation with a partially uploaded rain event is
+    replaced by a new simulation.
     """
-    rain_event_simulations = []
-    warnings = []
-    files = [f for f in rain_files_dir.iterdir() if f.is_file()]
-    for i, file in enumerate(files):
-        printProgressBar(i + 1, len(files), "Creating rain event simulations")
-        # retrievie rain timeseries data
-        with open(file, "r") as f:
-            timeseries = np.array(
-                [
-                    [int(row.split(",")[0]), float(row.split(",")[1])]
-                    for row in f.read().split("\n")
-                    if row
-                ]
-            )
+    name = rain_event["name"]
+    state = journal.state(name) if journal else {"simulation_id": None, "phases": {}}
+    if RAIN_UPLOADED in state["phases"] or QUEUED in state["phases"]:
+        return api_call(api.simulations_read, state["simulation_id"])
+
+    # create simulation
+    simulation = create_simulation(
+        api,
+        threedimodel_id,
+        organisation_id,
+        rain_event["duration"] + 30 * 60,  # extend 30 minutes to be safe
+        rain_event["start_date"],
+        f"rain series calculation {name}",
+    )
+    run_progress.state(CREATED, simulation.id, name)
+    if journal:
+        journal.record(name, CREATED, simulation.id, simulation.to_dict())
 
-        if timeseries[0, 0] != 0:
-            raise ValueError(f"{file.name}: first timestamp should be 0")
-        if timeseries[-1, 1] != 0:
-            warnings.append(f"Warning: {file.name} last rain intensity value is not 0")
-
-        # parse datetime from filename (NL datetime to UTC to timezone unaware)
-        filename_date = (
-            datetime.strptime(file.name.split()[-1], "%Y%m%d%H%M%S")
-            .astimezone(tz=pytz.timezone("Europe/Amsterdam"))
-            .astimezone(tz=pytz.UTC)
-            .replace(tzinfo=None)
+    if upload is None:
+        upload_rain_timeseries(
+            api, simulation, rain_event["time"], rain_event["intensities"]
         )
+    else:
+        upload(simulation)
+    if journal:
+        journal.record(name, RAIN_UPLOADED, simulation.id)
 
-        # Convert from [mm/timestep in minutes] to [m/s]
-        timesteps = np.diff(timeseries[:, 0])
-        values_converted = timeseries[:-1, 1] / (timesteps * 1000) / 60
-        values_converted = np.append(
-            values_converted, timeseries[-1, 1] / (timesteps[-1] * 1000) / 60
-        )
-        time = timeseries[:, 0] * 60
+    return simulation
 
-        # create simulation and set initial state
-        simulation = create_simulation(
-            api,
-            threedimodel_id,
-            organisation_id,
-            time[-1] + 30 * 60,  # extend the simulation 30 minutes to be safe
-            filename_date,
-            f"rain series calculation {file.name.split('.')[0]}",
-        )
+
+def start_rain_event_simulation(
+    api: V3BetaApi,
+    simulation: Simulation,
+    saved_states: List,
+    rain_event: Dict,
+    journal: Optional[Journal] = None,
+) -> Simulation:
+    """
+    Set the initial state of a prepared rain event simulation to the DWF saved state
+    of the hour the event starts and queue it.
+    """
+    name = rain_event["name"]
+    phases = journal.state(name)["phases"] if journal else {}
+    if SAVED_STATE_SET not in phases and QUEUED not in phases:
         api_call(
             api.simulations_initial_saved_state_create,
             simulation.id,
-            **{"data": {"saved_state": saved_states[filename_date.hour].id}},
+            **{"data": {"saved_state": saved_states[rain_event["start_date"].hour].id}},
         )
+        if journal:
+            journal.record(name, SAVED_STATE_SET, simulation.id)
 
-        for i in range((len(time) // 300) + 1):
-            time_slice = time[i * 300 : (i + 1) * 300]
-            time_slice_offset = time_slice - time_slice[0]
-            values_slice = values_converted[i * 300 : (i + 1) * 300]
-            values = [
-                [x[0], x[1]]
-                for x in np.stack((time_slice_offset, values_slice), axis=1)
-            ]
-            # Not allowed to have a timeseries of length 1, append timestep after 15 min
-            if len(values) == 1:
-                values.append([values[0][0] + 15 * 60, 0.0])
-
-            rain_data = {
-                "offset": time_slice[0],
-                "interpolate": False,
-                "values": values,
-                "units": "m/s",
-            }
-            api_call(
-                api.simulations_events_rain_timeseries_create,
-                simulation.id,
-                **{"data": rain_data},
-            )
-
-        rain_event_simulations.append(simulation)
+    if QUEUED not in phases:
         api_call(
             api.simulations_actions_create,
             *(
@@ -510,13 +780,247 @@ def create_simulations_from_rain_events(
                 Action(name="queue"),
             ),
         )
+        run_progress.state(QUEUED, simulation.id, name)
+        if journal:
+            journal.record(name, QUEUED, simulation.id)
+
+    return simulation
+
+
+def create_rain_event_simulation(
+    api: V3BetaApi,
+    saved_states: List,
+    threedimodel_id: int,
+    organisation_id: str,
+    rain_event: Dict,
+    journal: Optional[Journal] = None,
+) -> Simulation:
+    """
+    Create the simulation for a single rain event, add the timeseries rain event,
+    set its initial state and queue it.
+    """
+    simulation = prepare_rain_event_simulation(
+        api, threedimodel_id, organisation_id, rain_event, journal
+    )
+    return start_rain_event_simulation(
+        api, simulation, saved_states, rain_event, journal
+    )
+
+
+def rain_timeseries_chunks(
+    time: np.ndarray, values: np.ndarray, chunk_size: int = RAIN_CHUNK_SIZE
+) -> List[Dict]:
+    """
+    Split a rain timeseries into non-interpolated rain timeseries events of
+    chunk_size timesteps. Timesteps that repeat the value of the previous
+    timestep within a chunk (e.g. dry periods) are merged into a single
+    breakpoint and chunks without rain are skipped, the rain itself is unchanged.
+    """
+    index = np.arange(len(time))
+    keep = np.ones(len(time), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    # the first and last timestep of a chunk define its time range
+    keep[index % chunk_size == 0] = True
+    keep[index % chunk_size == chunk_size - 1] = True
+    keep[-1:] = True
+
+    chunks = []
+    for start in range(0, len(time), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        if not np.any(values[chunk]):
+            continue
+        time_slice = time[chunk][keep[chunk]]
+        values_slice = values[chunk][keep[chunk]]
+        rain_values = np.column_stack(
+            (time_slice - time_slice[0], values_slice)
+        ).tolist()
+        # Not allowed to have a timeseries of length 1, append timestep after 15 min
+        if len(rain_values) == 1:
+            rain_values.append([rain_values[0][0] + 15 * 60, 0.0])
+
+        chunks.append(
+            {
+                "offset": float(time_slice[0]),
+                "interpolate": False,
+                "values": rain_values,
+                "units": "m/s",
+            }
+        )
+    return chunks
+
+
+def upload_rain_timeseries(
+    api: V3BetaApi,
+    simulation: Simulation,
+    time: np.ndarray,
+    values_converted: np.ndarray,
+) -> None:
+    """Add the rain timeseries to the simulation, see rain_timeseries_chunks."""
+    for rain_data in rain_timeseries_chunks(time, values_converted):
+        api_call(
+            api.simulations_events_rain_timeseries_create,
+            simulation.id,
+            **{"data": rain_data},
+        )
+
+
+def create_simulations_from_rain_events(
+    api: V3BetaApi,
+    saved_states: Optional[List],
+    threedimodel_id: int,
+    organisation_id: str,
+    rain_events: List[Dict],
+    submit_workers: int = 1,
+    journal: Optional[Journal] = None,
+    dwf: Optional[Future] = None,
+) -> List[Simulation]:
+    """
+    Create simulations for the rain events with the initial state from the DWF runs
+    corresponding to their start time. Create timeseries rain event from file data.
+    Save created simulations to JSON as fallback.
+
+    Up to submit_workers rain events are set up concurrently. The steps for a single
+    event are always executed in order. Events that fail are reported and left out
+    of the returned simulations.
+
+    When dwf, the future of a running setup_dwf_simulation, is given instead of the
+    saved_states, all simulations are created and get their rain event while the
+    DWF simulation runs. They are started once its saved states are available.
+    """
+    failures = []
+
+    def submit_all(executor, fn, events, arguments, phase, text):
+        """Call fn for every event with its arguments, in order of the events."""
+        results = [None] * len(events)
+        futures = {executor.submit(fn, *args): i for i, args in enumerate(arguments)}
+        with run_progress.phase(phase, len(events), text):
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    run_progress.state(FAILED, name=events[i]["name"])
+                    failures.append(
+                        f"Error: {events[i]['file'].name} could not be submitted: {e}"
+                    )
+                run_progress.advance(phase)
+        return results
+
+    with ThreadPoolExecutor(max_workers=submit_workers) as executor:
+        if dwf is None:
+            results = submit_all(
+                executor,
+                create_rain_event_simulation,
+                rain_events,
+                [
+                    (
+                        api,
+                        saved_states,
+                        threedimodel_id,
+                        organisation_id,
+                        rain_event,
+                        journal,
+                    )
+                    for rain_event in rain_events
+                ],
+                SUBMISSION,
+                "Creating rain event simulations",
+            )
+        else:
+            simulations = submit_all(
+                executor,
+                prepare_rain_event_simulation,
+                rain_events,
+                [
+                    (api, threedimodel_id, organisation_id, rain_event, journal)
+                    for rain_event in rain_events
+                ],
+                PREPARATION,
+                "Preparing rain event simulations",
+            )
+            print("Waiting for the DWF simulation to finish...")
+            _, saved_states = dwf.result()
+            prepared = [
+                (simulation, rain_event)
+                for simulation, rain_event in zip(simulations, rain_events)
+                if simulation is not None
+            ]
+            results = submit_all(
+                executor,
+                start_rain_event_simulation,
+                [rain_event for _, rain_event in prepared],
+                [
+                    (api, simulation, saved_states, rain_event, journal)
+                    for simulation, rain_event in prepared
+                ],
+                SUBMISSION,
+                "Starting rain event simulations",
+            )
 
-    for warning in warnings:
-        print(warning)
+    rain_event_simulations = [result for result in results if result is not None]
+    for failure in failures:
+        print(failure)
 
     return rain_event_simulations
 
 
+def reuse_finished_simulations(
+    api: V3BetaApi,
+    index: SimulationIndex,
+    rain_events: List[Dict],
+    threedimodel_id: int,
+    revision_id: int,
+    organisation_id: str,
+    journal: Journal,
+    workers: int = 1,
+) -> int:
+    """
+    Look up the simulations of earlier batches for the rain events in the index,
+    see memo_key. Simulations that finished and have their aggregation results
+    uploaded are recorded as queued in the journal, so they are not submitted
+    again. Every simulation is reused for a single rain event.
+
+    Returns the number of reused simulations.
+    """
+    candidates = {}
+    for rain_event in rain_events:
+        if QUEUED in journal.state(rain_event["name"])["phases"]:
+            continue
+        key = memo_key(rain_event, threedimodel_id, revision_id)
+        simulation_id = index.get(key, organisation_id)
+        if simulation_id is not None and simulation_id not in candidates.values():
+            candidates[rain_event["name"]] = simulation_id
+
+    def finished_simulation(simulation_id: int) -> Optional[Simulation]:
+        try:
+            status = api_call(api.simulations_status_list, simulation_id)
+            if status.name != "finished":
+                return None
+            results = api_call(api.simulations_results_files_list, simulation_id)
+            if not any(
+                result.filename.startswith("agg") and result.file.state == "uploaded"
+                for result in results.results
+            ):
+                return None
+            return api_call(api.simulations_read, simulation_id)
+        except ApiException as e:
+            if e.status != 404:
+                raise e
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        simulations = executor.map(finished_simulation, candidates.values())
+        reused = 0
+        for name, simulation in zip(candidates, simulations):
+            if simulation is None:
+                continue
+            journal.record(name, CREATED, simulation.id, simulation.to_dict())
+            journal.record(name, QUEUED, simulation.id)
+            reused += 1
+
+    return reused
+
+
 def create_result_file(
     threedimodel_id: int,
     simulation_dwf: Simulation,
@@ -570,6 +1074,87 @@ def create_result_file(
     prompt=True,
     hide_input=True,
 )
+@click.option(
+    "--submit-workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of rain event simulations to set up concurrently [default: 1]",
+)
+@click.option(
+    "--parse-workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of processes used to read the rain files (and write the netcdf rain "
+    "files) [default: number of CPUs]",
+)
+@click.option(
+    "--max-requests-per-second",
+    type=click.FloatRange(min=0, min_open=True),
+    default=API_MAX_REQUESTS_PER_SECOND,
+    help="Maximum number of API requests per second [default: 10]",
+)
+@click.option(
+    "--resume",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Resume an interrupted batch using the journal in results_dir [default: False]",
+)
+@click.option(
+    "--reuse-dwf",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Reuse the saved states of a DWF simulation of an earlier --reuse-dwf batch "
+    "on the same model revision and register the DWF simulation of this batch "
+    "[default: False]",
+)
+@click.option(
+    "--reuse-simulations",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Reuse finished simulations of earlier --reuse-simulations batches with the "
+    "same rain event, model revision and saved state hour and register the "
+    "simulations of this batch [default: False]",
+)
+@click.option(
+    "--rain-format",
+    type=click.Choice(["timeseries", "netcdf"]),
+    default="timeseries",
+    help="Upload the rain events as rain timeseries or as netcdf rain files "
+    "[default: timeseries]",
+)
+@click.option(
+    "--pipeline",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Create the rain event simulations while the DWF simulation runs "
+    "[default: False]",
+)
+@click.option(
+    "--artifact-cache-dir",
+    type=click.Path(file_okay=False, writable=True, path_type=Path),
+    default=DEFAULT_ARTIFACT_CACHE_DIR,
+    help="Directory to cache model sqlites and gridadmins in "
+    "[default: $BATCH_CALCULATOR_CACHE_DIR or ~/.cache/batch-calculator]",
+)
+@click.option(
+    "--artifact-cache-size",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_ARTIFACT_CACHE_SIZE,
+    help="Maximum size of the artifact cache in GB, 0 disables the cache "
+    f"[default: {DEFAULT_ARTIFACT_CACHE_SIZE}]",
+)
+@click.option(
+    "--profile",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Profile CPU time and memory allocations per phase, written to the "
+    f"{PROFILE_DIRNAME} dir in results_dir (slows down the run) [default: False]",
+)
 def create_rain_series_simulations(
     threedimodel_id: int,
     rain_files_dir: Path,
@@ -577,6 +1162,17 @@ def create_rain_series_simulations(
     apikey: str,
     organisation: str,
     host: str,
+    submit_workers: int,
+    parse_workers: int,
+    max_requests_per_second: float,
+    resume: bool,
+    reuse_dwf: bool,
+    reuse_simulations: bool,
+    rain_format: str,
+    pipeline: bool,
+    artifact_cache_dir: Path,
+    artifact_cache_size: float,
+    profile: bool,
 ):
     """
     \b
@@ -589,52 +1185,169 @@ def create_rain_series_simulations(
     Second part:
         - start individual simulations which take a rain event as input
         - the filename contains information about the start date and time of the event
+
+    \b
+    The progress of each simulation is recorded in batch_journal.sqlite in
+    results_dir. Use --resume to continue an interrupted batch.
+
+    \b
+    With --reuse-dwf finished DWF simulations are registered per model revision in
+    the artifact cache dir and the DWF simulation is skipped when one is available.
+    Use --pipeline to create the rain event simulations while the DWF simulation
+    runs, they are started once its saved states are available.
+
+    \b
+    With --reuse-simulations submitted simulations are registered in the artifact
+    cache dir by the contents of their rain file, model revision and saved state
+    hour, and finished ones are reused instead of submitting them again.
+
+    \b
+    Use --profile to find CPU and memory hot spots, each phase is profiled with
+    cProfile and tracemalloc.
     """
+    api_rate_limit.configure(max_requests_per_second)
+    if profile:
+        run_metrics.profiler = PhaseProfiler(results_dir / PROFILE_DIRNAME)
+
+    # Read all rain files before spending any API calls
+    print("Reading and validating rain files...")
+    with run_metrics.phase("read_rain_files"):
+        rain_events = load_rain_events(rain_files_dir, parse_workers)
+    for rain_event in rain_events:
+        for warning in rain_event["warnings"]:
+            print(warning)
+
     config = {
         "THREEDI_API_HOST": host,
         "THREEDI_API_PERSONAL_API_TOKEN": apikey,
     }
-    with ThreediApi(config=config, version="v3-beta") as api:
+    with run_metrics.recording(
+        results_dir, "run-rain-series-simulations", api_rate_limit
+    ), run_progress.logging(results_dir / PROGRESS_LOG_FILENAME), ThreediApi(
+        config=config, version="v3-beta"
+    ) as api, open_journal(
+        results_dir, threedimodel_id, organisation, resume
+    ) as journal:
         api: V3BetaApi
-        sqlite_path = download_sqlite(api, threedimodel_id, results_dir)
-        validate_sqlite(sqlite_path)
+        artifact_cache = None
+        if artifact_cache_size > 0:
+            artifact_cache = ArtifactCache(
+                artifact_cache_dir, artifact_cache_size * 1e9
+            )
+        with run_metrics.phase("download_sqlite"):
+            sqlite_path = download_sqlite(
+                api, threedimodel_id, results_dir, artifact_cache
+            )
+            validate_sqlite(sqlite_path)
 
         # Setup simulation and in dry state to create saved states
-        print("Creating 3 day DWF simulation")
-        simulation_dwf: Simulation = create_simulation(
-            api,
-            threedimodel_id,
-            organisation,
-            3 * 24 * 60 * 60,
-            RAIN_EVENTS_START_DATE.strftime("%Y-%m-%dT%H:%M:%S"),
-        )
-        saved_states = create_saved_states(api, simulation_dwf)
-        api_call(
-            api.simulations_actions_create,
-            *(
-                simulation_dwf.id,
-                Action(name="queue"),
-            ),
-        )
-        await_simulation_completion(api, simulation_dwf)
+        threedimodel: ThreediModel = api_call(api.threedimodels_read, threedimodel_id)
+        # the registry and index are only used, and written, with their option
+        dwf_registry = None
+        if reuse_dwf:
+            dwf_registry = DWFRegistry(artifact_cache_dir / DWF_REGISTRY_FILENAME)
+        dwf = None
+        if reuse_dwf and CREATED not in journal.state(DWF)["phases"]:
+            with run_metrics.phase("reuse_dwf"):
+                dwf = reuse_dwf_simulation(
+                    api,
+                    dwf_registry,
+                    threedimodel_id,
+                    threedimodel.revision_id,
+                    organisation,
+                    journal,
+                )
+        simulation_index = None
+        if reuse_simulations:
+            simulation_index = SimulationIndex(
+                artifact_cache_dir / SIMULATION_INDEX_FILENAME
+            )
+            with run_metrics.phase("reuse_simulations"):
+                reused = reuse_finished_simulations(
+                    api,
+                    simulation_index,
+                    rain_events,
+                    threedimodel_id,
+                    threedimodel.revision_id,
+                    organisation,
+                    journal,
+                    submit_workers,
+                )
+            print(f"Reusing {reused} finished simulations of earlier batches")
 
-        # Convenience functions in case DWF simulation is already available
-        # simulation_dwf = api.simulations_read(22487)
-        # saved_states = get_saved_states(api, simulation_dwf)
-
-        # create netcdf files from rain timeseries and create simulations
-        # netcdfs = convert_to_netcdf(rain_files_dir)
-        # rain_event_simulations = create_simulations_from_netcdf_rain_events(
-        #     api,
-        #     saved_states,
-        #     netcdfs,
-        #     threedimodel_id,
-        #     organisation,
-        # )
-
-        rain_event_simulations = create_simulations_from_rain_events(
-            api, saved_states, threedimodel_id, organisation, rain_files_dir
-        )
+        if rain_format == "netcdf":
+            create_simulations = partial(
+                create_simulations_from_netcdf_rain_events,
+                netcdf_workers=parse_workers,
+            )
+        else:
+            create_simulations = create_simulations_from_rain_events
+
+        if dwf is None and pipeline:
+            # Create the rain event simulations while the DWF simulation runs
+            with ThreadPoolExecutor(max_workers=1) as dwf_executor:
+                dwf_future = dwf_executor.submit(
+                    run_metrics.timed("dwf", setup_dwf_simulation),
+                    api,
+                    threedimodel_id,
+                    organisation,
+                    journal,
+                )
+                with run_metrics.phase("submission"):
+                    rain_event_simulations = create_simulations(
+                        api,
+                        None,
+                        threedimodel_id,
+                        organisation,
+                        rain_events,
+                        submit_workers,
+                        journal,
+                        dwf=dwf_future,
+                    )
+            dwf = dwf_future.result()
+            if dwf_registry is not None:
+                dwf_registry.register(
+                    threedimodel_id, threedimodel.revision_id, organisation, dwf[0].id
+                )
+        else:
+            if dwf is None:
+                with run_metrics.phase("dwf"):
+                    dwf = setup_dwf_simulation(
+                        api, threedimodel_id, organisation, journal
+                    )
+                if dwf_registry is not None:
+                    dwf_registry.register(
+                        threedimodel_id,
+                        threedimodel.revision_id,
+                        organisation,
+                        dwf[0].id,
+                    )
+            with run_metrics.phase("submission"):
+                rain_event_simulations = create_simulations(
+                    api,
+                    dwf[1],
+                    threedimodel_id,
+                    organisation,
+                    rain_events,
+                    submit_workers,
+                    journal,
+                )
+        simulation_dwf, saved_states = dwf
+        print(f"API statistics: {api_rate_limit.stats()}")
+
+        # Register the simulations, so later batches can reuse them
+        if simulation_index is not None:
+            with simulation_index:
+                for rain_event in rain_events:
+                    state = journal.state(rain_event["name"])
+                    if QUEUED in state["phases"]:
+                        simulation_index.record(
+                            memo_key(
+                                rain_event, threedimodel_id, threedimodel.revision_id
+                            ),
+                            organisation,
+                            state["simulation_id"],
+                        )
 
         # write results to out_path
         create_result_file(
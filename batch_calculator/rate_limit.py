@@ -0,0 +1,61 @@
+import threading
+
+from time import monotonic, sleep
+from typing import Dict
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the number of requests per second. The
+    bucket holds at most burst tokens and is refilled with rate tokens per second.
+
+    pause() holds back all callers, e.g. after the server asked to slow down. The
+    counters are available through stats().
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = monotonic()
+        self.paused_until = 0.0
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "waited": 0.0}
+
+    def configure(self, rate: float, burst: int = 1) -> None:
+        with self.lock:
+            self.rate = rate
+            self.burst = burst
+            self.tokens = min(self.tokens, burst)
+
+    def acquire(self) -> None:
+        """Block until a request is allowed."""
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.counters["requests"] += 1
+                    return
+                wait = max(
+                    self.paused_until - now, (1 - self.tokens) / self.rate, 0.001
+                )
+                self.counters["waited"] += wait
+            sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all requests for the coming seconds."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, monotonic() + seconds)
+
+    def count(self, counter: str) -> None:
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            return dict(self.counters)
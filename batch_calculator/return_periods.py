@@ -0,0 +1,48 @@
+import numpy as np
+
+from typing import Sequence
+
+DEFAULT_RETURN_PERIODS = (1, 2, 5, 10)
+
+# Empirical (rank, factor) pairs used instead of linear interpolation for a 10
+# year series, keyed by (nr_years, return period).
+RANK_CORRECTIONS = {
+    (10, 5): (2, 0.48),
+    (10, 10): (1, 0.46),
+}
+
+
+def return_period_volumes(
+    results: np.ndarray,
+    nr_years: float,
+    return_periods: Sequence[float] = DEFAULT_RETURN_PERIODS,
+) -> np.ndarray:
+    """
+    Compute the volume with return period T for every weir in an events x weirs
+    array of volumes. The events are ranked per weir from large to small; the volume
+    with return period T has rank nr_years / T. Fractional ranks are interpolated
+    linearly between the neighbouring events.
+
+    Returns a return periods x weirs array, with NaN for return periods whose rank
+    falls outside the series.
+    """
+    # sort descending along the event axis, NaN values end up last
+    ranked = -np.sort(-np.asarray(results, dtype=np.float64), axis=0)
+    nr_events = ranked.shape[0]
+
+    volumes = np.full((len(return_periods), *ranked.shape[1:]), np.nan)
+    for i, T in enumerate(return_periods):
+        rank = nr_years / T
+        lower = int(np.floor(rank + 1e-9))
+        fraction = max(rank - lower, 0.0)
+        if fraction < 1e-9:
+            fraction = 0.0
+        lower, fraction = RANK_CORRECTIONS.get((nr_years, T), (lower, fraction))
+
+        if lower < 1 or lower > nr_events or (fraction and lower == nr_events):
+            continue
+        volumes[i] = ranked[lower - 1]
+        if fraction:
+            volumes[i] -= fraction * (ranked[lower - 1] - ranked[lower])
+
+    return volumes
@@ -0,0 +1,76 @@
+import hashlib
+import sqlite3
+import threading
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+SIMULATION_INDEX_FILENAME = "simulation_index.sqlite"
+
+
+def memo_key(rain_event: Dict, threedimodel_id: int, revision_id: int) -> str:
+    """
+    Key of the simulation of a rain event: the hash of the rain file contents, the
+    model revision and the hour of the DWF saved state the simulation starts from.
+    """
+    key = (
+        f"{rain_event['sha256']}:{threedimodel_id}:{revision_id}:"
+        f"{rain_event['start_date'].hour}"
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class SimulationIndex:
+    """
+    Local index of the simulations submitted per memo_key and organisation, used
+    to reuse finished simulations in later batches. Stored in a SQLite file.
+    """
+
+    def __init__(self, path: Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS simulations ("
+            "key TEXT NOT NULL, "
+            "organisation TEXT NOT NULL, "
+            "simulation_id INTEGER NOT NULL, "
+            "created TEXT NOT NULL, "
+            "PRIMARY KEY (key, organisation))"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get(self, key: str, organisation: str) -> Optional[int]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT simulation_id FROM simulations "
+                "WHERE key = ? AND organisation = ?",
+                (key, organisation),
+            ).fetchone()
+        return row[0] if row else None
+
+    def record(self, key: str, organisation: str, simulation_id: int) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO simulations "
+                "(key, organisation, simulation_id, created) VALUES (?, ?, ?, ?)",
+                (key, organisation, simulation_id, datetime.now().isoformat()),
+            )
+
+    def remove(self, key: str, organisation: str) -> None:
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM simulations WHERE key = ? AND organisation = ?",
+                (key, organisation),
+            )
@@ -0,0 +1,89 @@
+from batch_calculator.polling import MIN_POLL_INTERVAL, PollScheduler
+from batch_calculator.rain_series_simulations import api_call
+from threedi_api_client.openapi.models import SimulationStatus
+from threedi_api_client.versions import V3BetaApi
+from time import monotonic
+from typing import Dict, Iterable, Optional
+
+STATUS_IDS_PER_REQUEST = 100
+STATUS_PAGE_SIZE = 100
+
+
+def list_statuses(
+    api: V3BetaApi, simulation_ids: Iterable[int]
+) -> Dict[int, SimulationStatus]:
+    """
+    Fetch the latest status of many simulations at once from the paginated
+    statuses list, filtered on simulation ids.
+    """
+    simulation_ids = sorted(set(simulation_ids))
+    statuses = {}
+    for i in range(0, len(simulation_ids), STATUS_IDS_PER_REQUEST):
+        ids = simulation_ids[i : i + STATUS_IDS_PER_REQUEST]
+        offset = 0
+        while True:
+            page = api_call(
+                api.statuses_list,
+                simulation_id__in=ids,
+                limit=STATUS_PAGE_SIZE,
+                offset=offset,
+            )
+            for status in page.results:
+                if status.simulation_id in ids:
+                    statuses[status.simulation_id] = status
+            if page.next is None:
+                break
+            offset += STATUS_PAGE_SIZE
+
+    return statuses
+
+
+class StatusCache:
+    """
+    Latest statuses of a set of simulation ids, fetched in bulk by list_statuses.
+    A status older than max_age seconds is refreshed together with the other
+    stale statuses that are due to be polled by scheduler within max_age seconds
+    (all stale statuses without a scheduler), so the backoff of the scheduler is
+    kept. Simulations missing from the bulk results are requested one by one.
+    """
+
+    def __init__(
+        self,
+        api: V3BetaApi,
+        simulation_ids: Iterable[int],
+        scheduler: Optional[PollScheduler] = None,
+        max_age: float = MIN_POLL_INTERVAL,
+    ):
+        self.api = api
+        self.simulation_ids = set(simulation_ids)
+        self.scheduler = scheduler
+        self.max_age = max_age
+        self.statuses = {}
+        self.updated = {}  # simulation id -> time its status was fetched
+
+    def stale(self, simulation_id: int, now: float) -> bool:
+        return now - self.updated.get(simulation_id, float("-inf")) > self.max_age
+
+    def get(self, simulation_id: int) -> SimulationStatus:
+        now = monotonic()
+        if self.stale(simulation_id, now):
+            if self.scheduler is None:
+                due = self.simulation_ids
+            else:
+                due = self.simulation_ids.intersection(self.scheduler.due(self.max_age))
+            refresh = {simulation_id}.union(key for key in due if self.stale(key, now))
+            self.statuses.update(list_statuses(self.api, refresh))
+            for key in refresh:
+                self.updated[key] = now
+
+        status = self.statuses.get(simulation_id)
+        if status is None:
+            status = api_call(self.api.simulations_status_list, simulation_id)
+            self.statuses[simulation_id] = status
+        return status
+
+    def remove(self, simulation_id: int) -> None:
+        """Stop refreshing the status of a simulation."""
+        self.simulation_ids.discard(simulation_id)
+        self.statuses.pop(simulation_id, None)
+        self.updated.pop(simulation_id, None)
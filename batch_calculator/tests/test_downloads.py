@@ -0,0 +1,77 @@
+from batch_calculator import downloads
+from batch_calculator.downloads import download_file, file_complete
+
+import hashlib
+import io
+import pytest
+
+CONTENT = bytes(range(256)) * 10
+ETAG = f'"{hashlib.md5(CONTENT).hexdigest()}"'
+
+
+class Response(io.BytesIO):
+    def __init__(self, content: bytes, status: int):
+        super().__init__(content)
+        self.status = status
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Serve CONTENT, with Range requests, and record the requested ranges."""
+    ranges = []
+
+    def urlopen(request):
+        ranges.append(request.get_header("Range"))
+        if request.get_header("Range"):
+            offset = int(request.get_header("Range")[len("bytes=") : -1])
+            return Response(CONTENT[offset:], 206)
+        return Response(CONTENT, 200)
+
+    monkeypatch.setattr(downloads, "urlopen", urlopen)
+    return ranges
+
+
+def test_download(tmp_path, requests):
+    path = tmp_path / "file.nc"
+    assert download_file("http://host/file.nc", path, len(CONTENT), ETAG) == len(
+        CONTENT
+    )
+    assert path.read_bytes() == CONTENT
+    assert requests == [None]
+    assert file_complete(path, len(CONTENT), ETAG)
+
+
+def test_resume(tmp_path, requests):
+    path = tmp_path / "file.nc"
+    path.with_name("file.nc.part").write_bytes(CONTENT[:1000])
+    assert (
+        download_file("http://host/file.nc", path, len(CONTENT), ETAG)
+        == len(CONTENT) - 1000
+    )
+    assert path.read_bytes() == CONTENT
+    assert requests == ["bytes=1000-"]
+    assert not path.with_name("file.nc.part").exists()
+
+
+def test_corrupt_part_downloaded_again(tmp_path, requests):
+    path = tmp_path / "file.nc"
+    path.with_name("file.nc.part").write_bytes(b"x" * 1000)
+    download_file("http://host/file.nc", path, len(CONTENT), ETAG)
+    assert path.read_bytes() == CONTENT
+    assert requests == ["bytes=1000-", None]
+
+
+def test_md5_mismatch(tmp_path, requests):
+    path = tmp_path / "file.nc"
+    etag = hashlib.md5(b"other").hexdigest()
+    with pytest.raises(ValueError):
+        download_file("http://host/file.nc", path, len(CONTENT), etag)
+    assert not path.exists()
+    assert not path.with_name("file.nc.part").exists()
+
+
+def test_multipart_etag_not_compared(tmp_path):
+    path = tmp_path / "file.nc"
+    path.write_bytes(CONTENT)
+    assert file_complete(path, len(CONTENT), '"abc-2"')
+    assert not file_complete(path, len(CONTENT) + 1)
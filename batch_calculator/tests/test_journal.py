@@ -0,0 +1,90 @@
+from batch_calculator.journal import (
+    BATCH,
+    CREATED,
+    DWF,
+    Journal,
+    JOURNAL_FILENAME,
+    open_journal,
+    QUEUED,
+    RAIN_UPLOADED,
+    read_created_simulations,
+    SAVED_STATES_CREATED,
+    STARTED,
+)
+
+import pytest
+
+
+def test_state_round_trip(tmp_path):
+    with Journal(tmp_path / JOURNAL_FILENAME) as journal:
+        assert journal.state("event") == {"simulation_id": None, "phases": {}}
+        journal.record("event", CREATED, 1, {"id": 1})
+        journal.record("event", RAIN_UPLOADED, 1)
+        journal.record("other", CREATED, 2, {"id": 2})
+        assert journal.state("event") == {
+            "simulation_id": 1,
+            "phases": {CREATED: {"id": 1}, RAIN_UPLOADED: None},
+        }
+
+        # a new simulation for the event starts over at created
+        journal.record("event", CREATED, 3, {"id": 3})
+        assert journal.state("event") == {
+            "simulation_id": 3,
+            "phases": {CREATED: {"id": 3}},
+        }
+
+
+def test_events_in_order(tmp_path):
+    with Journal(tmp_path / JOURNAL_FILENAME) as journal:
+        for event in ("b", "a", "c"):
+            journal.record(event, CREATED)
+        for event in ("c", "b", "c"):
+            journal.record(event, QUEUED)
+        assert journal.events(CREATED) == ["b", "a", "c"]
+        assert journal.events(QUEUED) == ["c", "b"]
+
+
+def test_event_index(tmp_path):
+    with Journal(tmp_path / JOURNAL_FILENAME) as journal:
+        plan = journal.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT phase, simulation_id, data FROM journal "
+            "WHERE event = ? ORDER BY id",
+            ("event",),
+        ).fetchall()
+    assert "journal_event" in str(plan)
+
+
+def test_resume(tmp_path):
+    with open_journal(tmp_path, 1, "organisation", resume=False) as journal:
+        journal.record("event", CREATED, 10, {"id": 10})
+
+    with open_journal(tmp_path, 1, "organisation", resume=True) as journal:
+        assert journal.state("event")["simulation_id"] == 10
+        assert journal.state(BATCH)["phases"][STARTED] == {
+            "threedimodel_id": 1,
+            "organisation": "organisation",
+        }
+
+    with pytest.raises(ValueError):
+        open_journal(tmp_path, 2, "organisation", resume=True)
+
+    # a new batch moves the journal of the previous one aside
+    with open_journal(tmp_path, 1, "organisation", resume=False) as journal:
+        assert journal.state("event")["simulation_id"] is None
+    assert len(list(tmp_path.glob("batch_journal_*.sqlite"))) == 1
+
+
+def test_read_created_simulations(tmp_path):
+    with open_journal(tmp_path, 1, "organisation", resume=False) as journal:
+        journal.record(DWF, CREATED, 1, {"id": 1})
+        journal.record(DWF, SAVED_STATES_CREATED, 1, [{"id": 5}])
+        journal.record("queued", CREATED, 2, {"id": 2})
+        journal.record("queued", QUEUED, 2)
+        journal.record("created", CREATED, 3, {"id": 3})
+
+    assert read_created_simulations(tmp_path / JOURNAL_FILENAME) == {
+        "threedimodel_id": 1,
+        "simulation_dwf": {"id": 1},
+        "rain_event_simulations": [{"id": 2}],
+        "saved_states": [{"id": 5}],
+    }
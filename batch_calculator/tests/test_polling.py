@@ -0,0 +1,69 @@
+from batch_calculator.polling import PollScheduler
+from time import monotonic
+
+import pytest
+
+
+def scheduler(**kwargs):
+    return PollScheduler(
+        min_interval=0.02, max_interval=0.1, max_rate=float("inf"), **kwargs
+    )
+
+
+def test_order():
+    polls = scheduler()
+    polls.add("late", delay=0.04)
+    polls.add("early", delay=0.02)
+    polls.add("now")
+    order = []
+    while polls:
+        order.append(polls.poll())
+        polls.remove(order[-1])
+    assert order == ["now", "early", "late"]
+
+
+def test_poll_timeout():
+    polls = scheduler()
+    polls.add("key", delay=1)
+    assert polls.poll(timeout=0) is None
+    assert polls.due(within=0) == []
+    assert polls.due(within=2) == ["key"]
+
+
+def test_backoff():
+    polls = scheduler(keys=["key"])
+    intervals = []
+    for _ in range(4):
+        polls.poll()
+        intervals.append(polls.interval["key"])
+    assert intervals == [0.02, 0.04, 0.08, 0.1]
+
+
+def test_update():
+    polls = scheduler(keys=["key"])
+    polls.poll()
+    polls.update("key", 10)  # no earlier progress, keep backing off
+    assert polls.interval["key"] == 0.02
+
+    polls.progress["key"] = (monotonic() - 1, 0)
+    polls.update("key", 99)  # done in about 0.01 s, but not before min_interval
+    assert polls.interval["key"] == 0.02
+
+    polls.progress["key"] = (monotonic() - 10, 0)
+    polls.update("key", 50)  # done in about 10 s, but not after max_interval
+    assert polls.interval["key"] == 0.1
+    assert polls.next_poll["key"] - monotonic() == pytest.approx(0.1, abs=0.01)
+
+    polls.update("key", 100)
+    assert polls.interval["key"] == 0.02
+
+
+def test_remove():
+    polls = scheduler(keys=["a", "b", "c"])
+    polls.remove("b")
+    polls.update("b", 50)  # ignored for removed keys
+    assert len(polls) == 2
+    assert [polls.poll(), polls.poll()] == ["a", "c"]
+    polls.remove("a")
+    polls.remove("c")
+    assert list(polls) == []
@@ -0,0 +1,66 @@
+from batch_calculator.process_results import batch_calculation_statistics
+from batch_calculator.tests.test_return_periods import legacy_repetition_time_volumes
+from benchmarks.synthetic_results import generate_results
+from threedigrid.admin.gridresultadmin import GridH5AggregateResultAdmin
+
+import numpy as np
+import os
+import pandas
+
+
+def legacy_batch_calculation_statistics(netcdf_dir, gridadmin, nr_years):
+    """batch_calculation_statistics before the NumPy arrays, without nan_rows."""
+    nc_files = [file for file in os.listdir(netcdf_dir) if file.endswith(".nc")]
+    ga = GridH5AggregateResultAdmin(gridadmin, netcdf_dir / nc_files[0])
+    weir_pks = ga.lines.weirs.content_pk
+    results_cum = pandas.DataFrame(columns=["aggregate_netcdf", *weir_pks])
+    results_cum_negative = pandas.DataFrame(columns=["aggregate_netcdf", *weir_pks])
+    results_cum_positive = pandas.DataFrame(columns=["aggregate_netcdf", *weir_pks])
+
+    for i, aggregate_file in enumerate(nc_files):
+        ga = GridH5AggregateResultAdmin(gridadmin, netcdf_dir / aggregate_file)
+        weir_data = ga.lines.filter(content_type="v2_weir").only(
+            "content_pk",
+            "content_type",
+            "q_cum",
+            "q_cum_negative",
+            "q_cum_positive",
+        )
+        cumulative_discharge = [abs(x) for x in (weir_data.q_cum)[-1]]
+        negative_discharge = [abs(x) for x in (weir_data.q_cum_negative)[-1]]
+        positive_discharge = [abs(x) for x in (weir_data.q_cum_positive)[-1]]
+        results_cum.loc[i] = [aggregate_file, *cumulative_discharge]
+        results_cum_negative.loc[i] = [aggregate_file, *negative_discharge]
+        results_cum_positive.loc[i] = [aggregate_file, *positive_discharge]
+
+    rows = []
+    for weir in results_cum.columns[1:]:
+        rows.append(
+            [
+                weir,
+                sum(results_cum[weir] > 0) / nr_years,
+                sum(results_cum[weir]) / nr_years,
+                sum(results_cum_negative[weir] > 0) / nr_years,
+                sum(results_cum_negative[weir]) / nr_years,
+                sum(results_cum_positive[weir] > 0) / nr_years,
+                sum(results_cum_positive[weir]) / nr_years,
+                *legacy_repetition_time_volumes(results_cum[weir], nr_years),
+            ]
+        )
+    return np.array(rows, dtype=np.float64)
+
+
+def test_legacy_statistics(tmp_path):
+    nr_years = 10
+    gridadmin = generate_results(tmp_path, 25, 20, nr_timesteps=6, nr_channels=5)
+    output = batch_calculation_statistics(
+        tmp_path / "aggregation_netcdfs", str(gridadmin), nr_years, cache=False
+    )
+    legacy = legacy_batch_calculation_statistics(
+        tmp_path / "aggregation_netcdfs", str(gridadmin), nr_years
+    )
+
+    # the netcdfs are summed in another order, so the sums may differ in the
+    # last bits, the weir ids are integers instead of floats
+    assert output["weir_id"].dtype.kind == "i"
+    np.testing.assert_allclose(output.to_numpy(dtype=np.float64), legacy, rtol=1e-12)
@@ -0,0 +1,84 @@
+from batch_calculator.rain_series_simulations import rain_timeseries_chunks
+
+import numpy as np
+import pytest
+
+
+def legacy_rain_timeseries_chunks(time, values_converted):
+    """The rain timeseries payloads of upload_rain_timeseries before chunking."""
+    chunks = []
+    for i in range((len(time) // 300) + 1):
+        time_slice = time[i * 300 : (i + 1) * 300]
+        time_slice_offset = time_slice - time_slice[0]
+        values_slice = values_converted[i * 300 : (i + 1) * 300]
+        values = [
+            [x[0], x[1]] for x in np.stack((time_slice_offset, values_slice), axis=1)
+        ]
+        # Not allowed to have a timeseries of length 1, append timestep after 15 min
+        if len(values) == 1:
+            values.append([values[0][0] + 15 * 60, 0.0])
+
+        chunks.append(
+            {
+                "offset": time_slice[0],
+                "interpolate": False,
+                "values": values,
+                "units": "m/s",
+            }
+        )
+    return chunks
+
+
+def rain_at(chunk, times):
+    """The rain of a non-interpolated chunk at times relative to its offset."""
+    steps = np.array(chunk["values"])
+    return steps[np.searchsorted(steps[:, 0], times, side="right") - 1, 1]
+
+
+def random_rain(length, seed):
+    rng = np.random.default_rng(seed)
+    time = np.arange(length) * 300.0
+    # dry periods, constant showers and a dry first chunk
+    values = np.where(rng.random(length) < 0.7, 0.0, rng.integers(1, 4, length) / 1e6)
+    values = np.repeat(values[::3], 3)[:length]
+    values[:300] = 0.0
+    return time, values
+
+
+@pytest.mark.parametrize("length", [1, 299, 301, 1000, 2345])
+def test_legacy_chunks(length):
+    time, values = random_rain(length, length)
+    chunks = rain_timeseries_chunks(time, values)
+    legacy = [
+        chunk
+        for chunk in legacy_rain_timeseries_chunks(time, values)
+        if any(value for _, value in chunk["values"])
+    ]
+
+    # dry chunks are skipped, the other ones have the same boundaries
+    assert [chunk["offset"] for chunk in chunks] == [
+        chunk["offset"] for chunk in legacy
+    ]
+    for chunk, legacy_chunk in zip(chunks, legacy):
+        assert chunk["interpolate"] is False
+        assert chunk["values"][0][0] == 0.0
+        assert chunk["values"][-1][0] == legacy_chunk["values"][-1][0]
+        times = np.array(legacy_chunk["values"])[:, 0]
+        np.testing.assert_array_equal(
+            rain_at(chunk, times), rain_at(legacy_chunk, times)
+        )
+
+
+def test_dry_chunks_merged():
+    time = np.arange(600) * 300.0
+    values = np.zeros(600)
+    values[400:450] = 1e-6
+    chunks = rain_timeseries_chunks(time, values)
+    assert len(chunks) == 1
+    assert chunks[0]["offset"] == 300 * 300.0
+    assert chunks[0]["values"] == [
+        [0.0, 0.0],
+        [100 * 300.0, 1e-6],
+        [150 * 300.0, 0.0],
+        [299 * 300.0, 0.0],
+    ]
@@ -0,0 +1,31 @@
+from batch_calculator.rate_limit import TokenBucket
+from time import monotonic
+
+
+def test_rate():
+    bucket = TokenBucket(rate=100)
+    start = monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # the first request is allowed at once, the next 10 at 100 per second
+    assert monotonic() - start >= 0.09
+    assert bucket.stats()["requests"] == 11
+
+
+def test_burst():
+    bucket = TokenBucket(rate=1, burst=5)
+    start = monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert monotonic() - start < 0.5
+
+
+def test_pause():
+    bucket = TokenBucket(rate=1000)
+    bucket.acquire()
+    bucket.pause(0.1)
+    bucket.pause(0.01)  # does not shorten the pause
+    start = monotonic()
+    bucket.acquire()
+    assert monotonic() - start >= 0.09
+    assert bucket.stats()["waited"] >= 0.09
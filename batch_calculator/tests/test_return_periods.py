@@ -0,0 +1,66 @@
+from batch_calculator.return_periods import return_period_volumes
+from math import floor
+
+import numpy as np
+import pytest
+
+
+def legacy_repetition_time_volumes(weir_results, n, stats=[1, 2, 5, 10]):
+    """repetition_time_volumes before return_periods.py, for 10 and 25 years."""
+    sorted_weir_results = sorted(list(weir_results), reverse=True)
+    if n == 10:
+        T_volume_list = []
+        for T in stats:
+            if T == 5:
+                volume = sorted_weir_results[1] - 0.48 * (
+                    sorted_weir_results[1] - sorted_weir_results[2]
+                )
+                T_volume_list += [volume]
+            elif T == 10:
+                volume = sorted_weir_results[0] - 0.46 * (
+                    sorted_weir_results[0] - sorted_weir_results[1]
+                )
+                T_volume_list += [volume]
+            else:
+                T_volume_list += [sorted_weir_results[int(n / T) - 1]]
+
+    if n == 25:
+        T_volume_list = []
+        for T in stats:
+            if (n / T).is_integer():
+                T_volume_list += [sorted_weir_results[int(n / T) - 1]]
+            else:
+                volume = sorted_weir_results[floor(n / T) - 1] - 0.5 * (
+                    sorted_weir_results[floor(n / T) - 1]
+                    - sorted_weir_results[floor(n / T)]
+                )
+                T_volume_list += [volume]
+
+    return T_volume_list
+
+
+@pytest.mark.parametrize("nr_years", [10, 25])
+@pytest.mark.parametrize("nr_events", [25, 40, 200])
+def test_legacy_volumes(nr_years, nr_events):
+    results = np.random.default_rng(nr_events).random((nr_events, 30)) * 1000
+    volumes = return_period_volumes(results, nr_years)
+    for j in range(results.shape[1]):
+        np.testing.assert_allclose(
+            volumes[:, j], legacy_repetition_time_volumes(results[:, j], nr_years)
+        )
+
+
+def test_rank_corrections():
+    # ranked volumes 100, 90, 70, ...
+    results = np.array([[70.0], [100.0], [10.0], [90.0], [50.0]])
+    volumes = return_period_volumes(results, 10, [5, 10])
+    np.testing.assert_allclose(
+        volumes[:, 0], [90 - 0.48 * (90 - 70), 100 - 0.46 * (100 - 90)]
+    )
+
+
+def test_outside_series():
+    results = np.arange(1.0, 6.0)[:, np.newaxis]
+    volumes = return_period_volumes(results, 10, [1, 2, 10])
+    assert np.isnan(volumes[0, 0])
+    assert volumes[1, 0] == 1.0
@@ -0,0 +1,56 @@
+from batch_calculator.weir_cache import (
+    CACHE_FILENAME,
+    cached_rows,
+    load_weir_cache,
+    save_weir_cache,
+)
+
+import numpy as np
+import os
+import pytest
+
+
+@pytest.fixture
+def results(tmp_path):
+    gridadmin = tmp_path / "gridadmin.h5"
+    gridadmin.write_bytes(b"gridadmin")
+    paths = [tmp_path / f"aggregate_results_3di_sim_{i}.nc" for i in range(3)]
+    for path in paths:
+        path.write_bytes(path.name.encode())
+    cum = np.arange(6.0).reshape(3, 2)
+    cache_path = tmp_path / CACHE_FILENAME
+    save_weir_cache(cache_path, str(gridadmin), paths, [1, 2], cum, -cum, cum)
+    return cache_path, str(gridadmin), paths
+
+
+def test_round_trip(results):
+    cache_path, gridadmin, paths = results
+    cache = load_weir_cache(cache_path, gridadmin)
+    np.testing.assert_array_equal(cache["weir_pks"], [1, 2])
+    np.testing.assert_array_equal(cache["cum"], np.arange(6.0).reshape(3, 2))
+    # rows are found by filename, also in another order
+    np.testing.assert_array_equal(cached_rows(cache, paths[::-1]), [2, 1, 0])
+
+
+def test_changed_netcdf(results):
+    cache_path, gridadmin, paths = results
+    paths[0].write_bytes(b"another size")
+    stat = paths[1].stat()
+    os.utime(paths[1], (stat.st_atime, stat.st_mtime + 10))
+    new = paths[2].with_name("aggregate_results_3di_sim_9.nc")
+    new.write_bytes(b"new")
+
+    cache = load_weir_cache(cache_path, gridadmin)
+    np.testing.assert_array_equal(cached_rows(cache, [*paths, new]), [-1, -1, 2, -1])
+
+
+def test_changed_gridadmin(results):
+    cache_path, gridadmin, paths = results
+    with open(gridadmin, "ab") as f:
+        f.write(b"changed")
+    assert load_weir_cache(cache_path, gridadmin) is None
+    np.testing.assert_array_equal(cached_rows(None, paths), [-1, -1, -1])
+
+
+def test_missing_cache(tmp_path):
+    assert load_weir_cache(tmp_path / CACHE_FILENAME, "gridadmin.h5") is None
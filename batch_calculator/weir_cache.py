@@ -0,0 +1,79 @@
+import numpy as np
+
+from pathlib import Path
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+CACHE_FILENAME = "weir_results_cache.npz"
+
+
+def file_keys(paths: Sequence[Path]) -> np.ndarray:
+    """Return the (size, mtime) of every path as an n x 2 array."""
+    stats = [path.stat() for path in paths]
+    return np.array([[s.st_size, s.st_mtime] for s in stats], dtype=np.float64)
+
+
+def load_weir_cache(cache_path: Path, gridadmin: str) -> Optional[Dict]:
+    """
+    Load the extracted weir results of a previous run. The cache is only valid for
+    the gridadmin it was created with, None is returned otherwise.
+    """
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            cache = {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+
+    if not np.array_equal(cache.get("gridadmin_key"), file_keys([Path(gridadmin)])[0]):
+        return None
+    return cache
+
+
+def save_weir_cache(
+    cache_path: Path,
+    gridadmin: str,
+    paths: List[Path],
+    weir_pks: np.ndarray,
+    results_cum: np.ndarray,
+    results_cum_negative: np.ndarray,
+    results_cum_positive: np.ndarray,
+) -> None:
+    """
+    Store the extracted weir results per aggregation netcdf, keyed by filename
+    (containing the simulation id), file size and modification time.
+    """
+    # write to a temporary file first, so an interrupted run leaves a valid cache
+    tmp_path = cache_path.with_name(cache_path.stem + "_tmp.npz")
+    np.savez(
+        tmp_path,
+        gridadmin_key=file_keys([Path(gridadmin)])[0],
+        nc_files=np.array([path.name for path in paths]),
+        file_keys=file_keys(paths),
+        weir_pks=np.asarray(weir_pks),
+        cum=results_cum,
+        cum_negative=results_cum_negative,
+        cum_positive=results_cum_positive,
+    )
+    tmp_path.replace(cache_path)
+
+
+def cached_rows(cache: Optional[Dict], paths: List[Path]) -> np.ndarray:
+    """
+    Return for every path the row of its weir results in the cache, or -1 when it
+    is not cached or has changed since.
+    """
+    rows = np.full(len(paths), -1)
+    if cache is None or len(paths) == 0:
+        return rows
+
+    index = {name: i for i, name in enumerate(cache["nc_files"])}
+    keys = file_keys(paths)
+    for i, path in enumerate(paths):
+        row = index.get(path.name)
+        if row is not None and np.array_equal(cache["file_keys"][row], keys[i]):
+            rows[i] = row
+    return rows
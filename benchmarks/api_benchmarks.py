@@ -0,0 +1,187 @@
+"""
+Offline throughput benchmarks of the submission and download phases against a
+local fake 3Di API, see fake_api.py. Run from the repository root:
+
+    $ python -m benchmarks.api_benchmarks --events 100,1000,5000
+"""
+
+import click
+import io
+import numpy as np
+import tempfile
+
+from batch_calculator.process_results import download_results
+from batch_calculator.rain_series_simulations import (
+    api_rate_limit,
+    create_saved_states,
+    create_simulation,
+    create_simulations_from_rain_events,
+)
+from benchmarks.fake_api import FakeThreediApi
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from threedi_api_client import ThreediApi
+from time import monotonic
+from typing import Dict, List
+
+
+def synthetic_rain_events(nr_events: int, nr_timesteps: int) -> List[Dict]:
+    """Rain events of nr_timesteps 5 minute timesteps, rain in 1 of 4 timesteps."""
+    rng = np.random.default_rng(0)
+    events = []
+    for i in range(nr_events):
+        intensities = rng.random(nr_timesteps) * 1e-6
+        intensities[rng.random(nr_timesteps) < 0.75] = 0
+        events.append(
+            {
+                "file": Path(f"benchmark isahw{i} {i}.txt"),
+                "name": f"benchmark isahw{i} {i}",
+                "start_date": datetime(2000, 1, 1, i % 24),
+                "time": np.arange(nr_timesteps) * 300.0,
+                "intensities": intensities,
+                "duration": nr_timesteps * 300,
+            }
+        )
+    return events
+
+
+def benchmark_batch(fake: FakeThreediApi, nr_events: int, options: Dict) -> Dict:
+    config = {
+        "THREEDI_API_HOST": fake.host,
+        "THREEDI_API_PERSONAL_API_TOKEN": "benchmark",
+    }
+    rain_events = synthetic_rain_events(nr_events, options["timesteps"])
+    with ThreediApi(config=config, version="v3-beta") as api, redirect_stdout(
+        io.StringIO()
+    ):
+        simulation_dwf = create_simulation(api, 1, "benchmark", 3 * 24 * 3600, "1955")
+        saved_states = create_saved_states(api, simulation_dwf)
+
+        fake.calls.clear()
+        start = monotonic()
+        simulations = create_simulations_from_rain_events(
+            api,
+            saved_states,
+            1,
+            "benchmark",
+            rain_events,
+            options["submit_workers"],
+        )
+        submit_time = monotonic() - start
+        submit_calls = sum(fake.calls.values()) - fake.calls["throttled"]
+        throttled = fake.calls["throttled"]
+
+        fake.calls.clear()
+        with tempfile.TemporaryDirectory() as results_dir:
+            start = monotonic()
+            download_results(
+                api,
+                [simulation.to_dict() for simulation in simulations],
+                Path(results_dir),
+                1,
+                False,
+                options["download_workers"],
+            )
+            download_time = monotonic() - start
+        # the gridadmin plus one aggregation netcdf per simulation
+        downloaded = fake.file_size * (len(simulations) + 1)
+
+    return {
+        "events": nr_events,
+        "submitted": len(simulations),
+        "events/s": nr_events / submit_time,
+        "calls/event": submit_calls / nr_events,
+        "throttled": throttled,
+        "download MB/s": downloaded / 1e6 / download_time,
+        "download calls/event": sum(fake.calls.values()) / nr_events,
+    }
+
+
+@click.command()
+@click.option(
+    "--events",
+    type=str,
+    default="100,1000",
+    help="Comma separated batch sizes [default: 100,1000]",
+)
+@click.option(
+    "--timesteps",
+    type=click.IntRange(min=1),
+    default=600,
+    help="Number of 5 minute timesteps per rain event [default: 600]",
+)
+@click.option(
+    "--latency",
+    type=click.FloatRange(min=0),
+    default=0.05,
+    help="Latency of every API request in seconds [default: 0.05]",
+)
+@click.option(
+    "--throttle",
+    type=click.FloatRange(min=0, max=1),
+    default=0.0,
+    help="Fraction of API requests answered with 429 [default: 0]",
+)
+@click.option(
+    "--retry-after",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    help="Retry-After of the 429 responses in seconds [default: 1]",
+)
+@click.option(
+    "--file-size",
+    type=click.IntRange(min=1),
+    default=1_000_000,
+    help="Size of the result files in bytes [default: 1000000]",
+)
+@click.option(
+    "--submit-workers",
+    type=click.IntRange(min=1),
+    default=8,
+    help="Number of rain event simulations set up concurrently [default: 8]",
+)
+@click.option(
+    "--download-workers",
+    type=click.IntRange(min=1),
+    default=4,
+    help="Number of result files downloaded concurrently [default: 4]",
+)
+@click.option(
+    "--max-requests-per-second",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1000,
+    help="API rate limit of the client [default: 1000]",
+)
+def api_benchmarks(
+    events: str,
+    timesteps: int,
+    latency: float,
+    throttle: float,
+    retry_after: float,
+    file_size: int,
+    submit_workers: int,
+    download_workers: int,
+    max_requests_per_second: float,
+):
+    """Benchmark submitting and downloading batches against a fake 3Di API."""
+    options = {
+        "timesteps": timesteps,
+        "submit_workers": submit_workers,
+        "download_workers": download_workers,
+    }
+    api_rate_limit.configure(max_requests_per_second)
+    rows = []
+    for nr_events in [int(n) for n in events.split(",")]:
+        with FakeThreediApi(latency, throttle, retry_after, file_size) as fake:
+            rows.append(benchmark_batch(fake, nr_events, options))
+        click.echo(
+            "  ".join(
+                f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}"
+                for key, value in rows[-1].items()
+            )
+        )
+
+
+if __name__ == "__main__":
+    api_benchmarks()
@@ -0,0 +1,326 @@
+"""
+Local stand-in for the 3Di API endpoints used by batch_calculator, for offline
+benchmarks. Not a complete or faithful implementation of the API.
+"""
+
+import base64
+import itertools
+import json
+import random
+import re
+import threading
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+RESULT_FILES = ("aggregate_results_3di.nc", "log_files_sim_{id}.zip", "results_3di.nc")
+
+
+def fake_jwt() -> str:
+    """A token the api client accepts as not expired, it is never verified."""
+
+    def encode(data: Dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    exp = int((datetime.now() + timedelta(days=1)).timestamp())
+    return f"{encode({'alg': 'none'})}.{encode({'exp': exp})}.signature"
+
+
+class FakeThreediApi:
+    """
+    Serve the fake API on a local port from a background thread, use as a context
+    manager. Every request is delayed by latency seconds and a throttle fraction of
+    the requests is answered with 429 (Retry-After: retry_after). Queued
+    simulations finish after simulation_time seconds, their result files and the
+    gridadmin are file_size bytes.
+
+    Calls per endpoint are counted in calls.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        throttle: float = 0.0,
+        retry_after: float = 0.0,
+        file_size: int = 1_000_000,
+        simulation_time: float = 0.0,
+    ):
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.file_size = file_size
+        self.simulation_time = simulation_time
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.ids = itertools.count(1)
+        self.simulations: Dict[int, Dict] = {}
+        self.routes = [
+            ("POST", r"/v3/auth/token/", self.token),
+            ("GET", r"/v3/simulation-templates/", self.templates),
+            ("POST", r"/v3/simulations/from-template/", self.from_template),
+            ("GET", r"/v3/simulations/(\d+)/", self.simulation),
+            ("POST", r"/v3/simulations/(\d+)/actions/", self.action),
+            ("GET", r"/v3/simulations/(\d+)/status/", self.status),
+            ("GET", r"/v3/simulations/(\d+)/progress/", self.progress),
+            (
+                "POST",
+                r"/v3/simulations/(\d+)/create-saved-states/timed/",
+                self.saved_state,
+            ),
+            (
+                "GET",
+                r"/v3/simulations/(\d+)/create-saved-states/timed/",
+                self.saved_states,
+            ),
+            ("POST", r"/v3/simulations/(\d+)/initial/saved_state/", self.initial_state),
+            ("POST", r"/v3/simulations/(\d+)/events/rain/timeseries/", self.rain),
+            ("GET", r"/v3/simulations/(\d+)/results/files/", self.result_files),
+            (
+                "GET",
+                r"/v3/simulations/(\d+)/results/files/(\d+)/download/",
+                self.result_download,
+            ),
+            ("GET", r"/v3/statuses/", self.statuses),
+            ("GET", r"/v3/threedimodels/(\d+)/gridadmin/download/", self.gridadmin),
+            ("GET", r"/files/(.+)", self.file),
+        ]
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # keep-alive with headers and body in separate writes: without this
+            # Nagle's algorithm and delayed ACKs add ~40 ms to every request
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake.handle(self, "GET")
+
+            def do_POST(self):
+                fake.handle(self, "POST")
+
+        return Handler
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        url = urlparse(request.path)
+        length = int(request.headers.get("Content-Length") or 0)
+        body = json.loads(request.rfile.read(length) or "null")
+        for route_method, pattern, view in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self.respond(request, 404, {"detail": "Not found."})
+
+        with self.lock:
+            self.calls[view.__name__] += 1
+        if view != self.file:
+            sleep(self.latency)
+            if random.random() < self.throttle:
+                with self.lock:
+                    self.calls["throttled"] += 1
+                return self.respond(
+                    request,
+                    429,
+                    {"detail": "Throttled"},
+                    {"Retry-After": self.retry_after},
+                )
+
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if view == self.file:
+            return view(request, *match.groups())
+        status, data = view(*match.groups(), query=query, body=body)
+        self.respond(request, status, data)
+
+    def respond(
+        self,
+        request: BaseHTTPRequestHandler,
+        status: int,
+        data,
+        headers: Optional[Dict] = None,
+    ) -> None:
+        content = json.dumps(data).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, str(value))
+        request.end_headers()
+        request.wfile.write(content)
+
+    def page(self, results, query) -> Dict:
+        limit = int(query.get("limit", 100))
+        offset = int(query.get("offset", 0))
+        more = offset + limit < len(results)
+        return {
+            "count": len(results),
+            "next": f"{self.host}/next" if more else None,
+            "previous": None,
+            "results": results[offset : offset + limit],
+        }
+
+    def now(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def simulation_data(self, simulation: Dict) -> Dict:
+        return {
+            "id": simulation["id"],
+            "name": simulation["name"],
+            "threedimodel": f"{self.host}/v3/threedimodels/1/",
+            "threedimodel_id": 1,
+            "organisation": "benchmark",
+            "start_datetime": simulation["start_datetime"],
+            "duration": simulation["duration"],
+        }
+
+    def state(self, simulation: Dict) -> str:
+        if simulation["queued"] is None:
+            return "created"
+        if monotonic() - simulation["queued"] < self.simulation_time:
+            return "initialized"
+        return "finished"
+
+    def token(self, query, body):
+        return 201, {"access": fake_jwt(), "refresh": fake_jwt()}
+
+    def templates(self, query, body):
+        return 200, self.page([{"id": 1, "name": "benchmark template"}], query)
+
+    def from_template(self, query, body):
+        simulation = {
+            "id": next(self.ids),
+            "name": body["name"],
+            "duration": body["duration"],
+            "start_datetime": body["start_datetime"],
+            "queued": None,
+            "saved_states": [],
+        }
+        with self.lock:
+            self.simulations[simulation["id"]] = simulation
+        return 201, self.simulation_data(simulation)
+
+    def simulation(self, simulation_id, query, body):
+        return 200, self.simulation_data(self.simulations[int(simulation_id)])
+
+    def action(self, simulation_id, query, body):
+        if body["name"] == "queue":
+            self.simulations[int(simulation_id)]["queued"] = monotonic()
+        return 201, {"name": body["name"]}
+
+    def status(self, simulation_id, query, body):
+        simulation = self.simulations[int(simulation_id)]
+        return 200, {
+            "id": simulation["id"],
+            "name": self.state(simulation),
+            "created": self.now(),
+            "time": (
+                simulation["duration"] if self.state(simulation) == "finished" else 0
+            ),
+        }
+
+    def progress(self, simulation_id, query, body):
+        simulation = self.simulations[int(simulation_id)]
+        finished = self.state(simulation) == "finished"
+        return 200, {"time": 0, "percentage": 100 if finished else 0}
+
+    def saved_state(self, simulation_id, query, body):
+        simulation = self.simulations[int(simulation_id)]
+        saved_state = {
+            "id": next(self.ids),
+            "name": body["name"],
+            "time": body["time"],
+            "expiry": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
+        }
+        simulation["saved_states"].append(saved_state)
+        return 201, saved_state
+
+    def saved_states(self, simulation_id, query, body):
+        simulation = self.simulations[int(simulation_id)]
+        return 200, self.page(simulation["saved_states"], query)
+
+    def initial_state(self, simulation_id, query, body):
+        return 201, {"saved_state": body["saved_state"]}
+
+    def rain(self, simulation_id, query, body):
+        return 201, {"offset": body["offset"], "values": body["values"]}
+
+    def result_files(self, simulation_id, query, body):
+        simulation = self.simulations[int(simulation_id)]
+        if self.state(simulation) != "finished":
+            return 200, self.page([], query)
+        results = [
+            {
+                "id": i,
+                "filename": filename.format(id=simulation_id),
+                "created": self.now(),
+                "file": {"state": "uploaded", "size": self.file_size},
+            }
+            for i, filename in enumerate(RESULT_FILES, start=1)
+        ]
+        return 200, self.page(results, query)
+
+    def result_download(self, simulation_id, result_id, query, body):
+        filename = RESULT_FILES[int(result_id) - 1].format(id=simulation_id)
+        return 200, {
+            "get_url": f"{self.host}/files/{simulation_id}/{filename}",
+            "size": self.file_size,
+        }
+
+    def statuses(self, query, body):
+        ids = {int(id) for id in query.get("simulation_id__in", "").split(",") if id}
+        results = [
+            {
+                "id": simulation["id"],
+                "name": self.state(simulation),
+                "simulation_id": simulation["id"],
+                "time": simulation["duration"],
+            }
+            for simulation in list(self.simulations.values())
+            if simulation["id"] in ids
+        ]
+        return 200, self.page(results, query)
+
+    def gridadmin(self, threedimodel_id, query, body):
+        return 200, {
+            "get_url": f"{self.host}/files/gridadmin.h5",
+            "size": self.file_size,
+        }
+
+    def file(self, request: BaseHTTPRequestHandler, path: str) -> None:
+        """Serve file_size bytes, supporting Range requests."""
+        start = 0
+        if request.headers.get("Range"):
+            start = int(re.match(r"bytes=(\d+)-", request.headers["Range"]).group(1))
+            request.send_response(206)
+        else:
+            request.send_response(200)
+        size = self.file_size - start
+        request.send_header("Content-Length", str(size))
+        request.end_headers()
+        chunk = bytes(min(size, 1024 * 1024))
+        while size > 0:
+            request.wfile.write(chunk[:size])
+            size -= len(chunk)
@@ -0,0 +1,166 @@
+"""
+Runtime and peak RSS of batch_calculation_statistics over a matrix of events x
+weirs on synthetic aggregation netcdfs, see synthetic_results.py. Run from the
+repository root:
+
+    $ python -m benchmarks.statistics_benchmarks --events 100,1000,5000 \\
+        --weirs 100,1000,20000 --output statistics_benchmarks.csv
+
+Every case runs in a fresh process, so the peak RSS is that of the statistics
+stage only. With --workers > 1 the largest peak RSS of the worker processes is
+reported as well. The netcdfs of the largest number of events are generated once per
+number of weirs and hard linked into the smaller cases.
+"""
+
+import click
+import csv
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+
+from batch_calculator.process_results import batch_calculation_statistics
+from benchmarks.synthetic_results import generate_results
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+from time import monotonic
+from typing import Dict, List
+
+
+def parse_sizes(ctx, param, value) -> List[int]:
+    try:
+        return sorted(int(n) for n in value.split(","))
+    except ValueError:
+        raise click.BadParameter(f"{value} is not a comma separated list of numbers")
+
+
+def run_statistics(
+    netcdf_dir: Path, gridadmin: Path, nr_years: int, workers: int
+) -> Dict:
+    """Run the statistics stage, meant to be called in a fresh process."""
+    start = monotonic()
+    with redirect_stdout(io.StringIO()):
+        batch_calculation_statistics(
+            netcdf_dir, str(gridadmin), nr_years, workers, cache=False
+        )
+    runtime = monotonic() - start
+    # ru_maxrss is in kilobytes on Linux
+    result = {
+        "runtime (s)": runtime,
+        "peak RSS (MB)": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+    }
+    if workers > 1:
+        # the pool workers are the only children of this process
+        result["peak worker RSS (MB)"] = (
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3
+        )
+    return result
+
+
+def benchmark_case(
+    source_dir: Path, case_dir: Path, nr_events: int, nr_years: int, workers: int
+) -> Dict:
+    """Benchmark the statistics of the first nr_events netcdfs in source_dir."""
+    netcdf_dir = case_dir / "aggregation_netcdfs"
+    netcdf_dir.mkdir(parents=True)
+    for i in range(nr_events):
+        name = f"aggregate_results_3di_sim_{i + 1}.nc"
+        os.link(source_dir / "aggregation_netcdfs" / name, netcdf_dir / name)
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(
+            run_statistics,
+            netcdf_dir,
+            source_dir / "gridadmin.h5",
+            nr_years,
+            workers,
+        ).result()
+
+
+@click.command()
+@click.option(
+    "--events",
+    type=str,
+    default="100,1000",
+    callback=parse_sizes,
+    help="Comma separated numbers of events [default: 100,1000]",
+)
+@click.option(
+    "--weirs",
+    type=str,
+    default="100,1000,10000",
+    callback=parse_sizes,
+    help="Comma separated numbers of weirs [default: 100,1000,10000]",
+)
+@click.option(
+    "--timesteps",
+    type=click.IntRange(min=1),
+    default=24,
+    help="Number of hourly timesteps per netcdf [default: 24]",
+)
+@click.option(
+    "--years",
+    type=click.IntRange(min=1),
+    default=50,
+    help="Number of years of the rain series [default: 50]",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes reading netcdfs [default: 1]",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="CSV file the results are written to",
+)
+def statistics_benchmarks(
+    events: List[int],
+    weirs: List[int],
+    timesteps: int,
+    years: int,
+    workers: int,
+    output: Path,
+):
+    """Benchmark the statistics stage over a matrix of events x weirs."""
+    rows = []
+    for nr_weirs in weirs:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_dir = Path(tmp_dir, "source")
+            generate_results(source_dir, events[-1], nr_weirs, timesteps)
+            for nr_events in events:
+                row = {"events": nr_events, "weirs": nr_weirs}
+                row.update(
+                    benchmark_case(
+                        source_dir,
+                        Path(tmp_dir, f"events_{nr_events}"),
+                        nr_events,
+                        years,
+                        workers,
+                    )
+                )
+                rows.append(row)
+                click.echo(
+                    "  ".join(
+                        (
+                            f"{key}: {value:.2f}"
+                            if isinstance(value, float)
+                            else f"{key}: {value}"
+                        )
+                        for key, value in row.items()
+                    )
+                )
+
+    if output:
+        with output.open("w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    statistics_benchmarks()
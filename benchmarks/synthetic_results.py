@@ -0,0 +1,144 @@
+"""
+Synthetic gridadmin.h5 and aggregation netcdfs that GridH5AggregateResultAdmin can
+read, with only the lines and cumulative discharge variables batch_calculator
+uses. Generate a results dir from the repository root:
+
+    $ python -m benchmarks.synthetic_results results/ --events 100 --weirs 1000
+"""
+
+import click
+import h5py
+import netCDF4 as nc4
+import numpy as np
+
+from pathlib import Path
+
+CONTENT_TYPES = np.array([b"v2_channel", b"v2_weir"])
+
+
+def write_gridadmin(
+    path: Path, nr_weirs: int, nr_channels: int = 0, seed: int = 0
+) -> None:
+    """
+    Write a gridadmin with nr_weirs weirs (content_pk 1 to nr_weirs) shuffled
+    between nr_channels channels, all 1D lines.
+    """
+    rng = np.random.default_rng(seed)
+    is_weir = rng.permutation(np.arange(nr_weirs + nr_channels) < nr_weirs)
+    content_pk = np.empty(len(is_weir), dtype=np.int32)
+    content_pk[is_weir] = np.arange(1, nr_weirs + 1)
+    content_pk[~is_weir] = np.arange(1, nr_channels + 1)
+
+    with h5py.File(path, "w") as f:
+        f.attrs["has_1d"] = 1
+        f.attrs["has_2d"] = 0
+        f.attrs["model_slug"] = "synthetic"
+        f.create_group("meta")
+        # the first line is a dummy, as in real gridadmins
+        lines = f.create_group("lines")
+        lines["id"] = np.arange(len(is_weir) + 1, dtype=np.int32)
+        lines["kcu"] = np.full(len(is_weir) + 1, 1, dtype=np.int32)
+        lines["content_pk"] = np.concatenate([[0], content_pk])
+        lines["content_type"] = np.concatenate(
+            [[b""], CONTENT_TYPES[is_weir.astype(int)]]
+        )
+
+
+def write_aggregate_netcdf(
+    path: Path, nr_lines: int, nr_timesteps: int, rng: np.random.Generator
+) -> None:
+    """
+    Write the hourly cumulative discharge of nr_lines 1D lines, positive in 1 of
+    4 timesteps and negative in 1 of 20.
+    """
+    shape = (nr_timesteps, nr_lines)
+    positive = rng.random(shape) * (rng.random(shape) < 0.25)
+    negative = -rng.random(shape) * (rng.random(shape) < 0.05)
+    with nc4.Dataset(path, "w") as dataset:
+        dataset.createDimension("nMesh1D_lines", nr_lines)
+        dataset.createDimension("time_q_cum", nr_timesteps)
+        time = dataset.createVariable("time_q_cum", "f8", ("time_q_cum",))
+        time[:] = np.arange(1, nr_timesteps + 1) * 3600.0
+        line_id = dataset.createVariable("Mesh1DLine_id", "i4", ("nMesh1D_lines",))
+        line_id[:] = np.arange(1, nr_lines + 1)
+        for name, discharge in (
+            ("q_cum", positive + negative),
+            ("q_cum_positive", positive),
+            ("q_cum_negative", negative),
+        ):
+            variable = dataset.createVariable(
+                f"Mesh1D_{name}", "f8", ("time_q_cum", "nMesh1D_lines")
+            )
+            variable[:] = np.cumsum(discharge * 3600, axis=0)
+
+
+def generate_results(
+    results_dir: Path,
+    nr_events: int,
+    nr_weirs: int,
+    nr_timesteps: int = 24,
+    nr_channels: int = 0,
+    seed: int = 0,
+) -> Path:
+    """
+    Create results_dir/gridadmin.h5 and nr_events aggregation netcdfs in
+    results_dir/aggregation_netcdfs, the layout process_results downloads to.
+    Return the path of the gridadmin.
+    """
+    netcdf_dir = results_dir / "aggregation_netcdfs"
+    netcdf_dir.mkdir(parents=True, exist_ok=True)
+    gridadmin = results_dir / "gridadmin.h5"
+    write_gridadmin(gridadmin, nr_weirs, nr_channels, seed)
+
+    rng = np.random.default_rng(seed)
+    for i in range(nr_events):
+        write_aggregate_netcdf(
+            netcdf_dir / f"aggregate_results_3di_sim_{i + 1}.nc",
+            nr_weirs + nr_channels,
+            nr_timesteps,
+            rng,
+        )
+    return gridadmin
+
+
+@click.command()
+@click.argument("results_dir", type=click.Path(file_okay=False, path_type=Path))
+@click.option(
+    "--events",
+    type=click.IntRange(min=1),
+    default=100,
+    help="Number of aggregation netcdfs [default: 100]",
+)
+@click.option(
+    "--weirs",
+    type=click.IntRange(min=1),
+    default=1000,
+    help="Number of weirs [default: 1000]",
+)
+@click.option(
+    "--channels",
+    type=click.IntRange(min=0),
+    default=0,
+    help="Number of other 1D lines [default: 0]",
+)
+@click.option(
+    "--timesteps",
+    type=click.IntRange(min=1),
+    default=24,
+    help="Number of hourly timesteps per netcdf [default: 24]",
+)
+@click.option("--seed", type=int, default=0, help="Random seed [default: 0]")
+def synthetic_results(
+    results_dir: Path,
+    events: int,
+    weirs: int,
+    channels: int,
+    timesteps: int,
+    seed: int,
+):
+    """Generate a synthetic gridadmin and aggregation netcdfs in RESULTS_DIR."""
+    generate_results(results_dir, events, weirs, timesteps, channels, seed)
+
+
+if __name__ == "__main__":
+    synthetic_results()